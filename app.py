@@ -8,53 +8,60 @@ except RuntimeError:
     pass
 '''
 import os
+from concurrent.futures import wait
 from pathlib import Path
 import streamlit as st
 import pandas as pd
-import ast
 import numpy as np
 # --- ваш бизнес-код ---
 from stylist_core import generate_look, filter_dataset
+from catalog import CatalogIndex, DERIVED_COLUMNS, default_catalog_path
+from catalog_manager import CatalogManager
+from llm_cache import get_look_cache
+from assembler import assemble_looks
+from telemetry import REGISTRY, span, trace
+from feedback_store import FeedbackStore
+from image_cache import ImageCache
 
 # ──────────────────────────────────────────────────────────────
 # Константы (можно переопределить через переменные окружения)
 DATA_DIR = Path(__file__).resolve().parent / "data"
-DEFAULT_DATA_PATH = Path(
-    os.getenv("DATA_PATH", DATA_DIR / "clothes_enriched_new_cat1_only.csv")
-).expanduser()
+# DATA_PATH или Parquet-артефакт (`python catalog.py build ...`), иначе исходный CSV
+DEFAULT_DATA_PATH = default_catalog_path()
 DEFAULT_OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
-SUPPORTED_EXT = {".parquet", ".csv"}
+# Хранилище отзывов (SQLite); старый CSV переносится в него при первом запуске
+FEEDBACK_PATH = Path(os.getenv("FEEDBACK_PATH", DATA_DIR / "users_feedback.sqlite")).expanduser()
+LEGACY_FEEDBACK_CSV = DATA_DIR / "users_feedback.csv"
 
-# Путь для хранения отзывов
-FEEDBACK_PATH = DATA_DIR / "users_feedback.csv"
-
-# Загружаем существующие отзывы или создаем новый DataFrame
-if FEEDBACK_PATH.exists():
-    users_feedback = pd.read_csv(FEEDBACK_PATH)
-else:
-    users_feedback = pd.DataFrame(columns=["user_query", "selected_look", "comment"])
+# Сколько ждать миниатюры луков (все разом) перед рендером
+IMAGE_WAIT_SECONDS = 5.0
 # ──────────────────────────────────────────────────────────────
 
 st.set_page_config(page_title="Fashion Look Finder", layout="wide")
 st.title("👗 Total-Look Stylist")
 
-def to_list(val):
-    """
-    Преобразует строку-представление списка в настоящий список.
-    Оставляет без изменений NaN и уже готовые списки.
-    """
-    if pd.isna(val) or isinstance(val, list):
-        return val
-    return ast.literal_eval(val)   # безопасный eval для литералов
-
-df_enriched = pd.read_csv(
-    DEFAULT_DATA_PATH,
-    converters={'category_id': to_list}
-)
-df_enriched = df_enriched.fillna("")
+@st.cache_resource(show_spinner="Загружаем каталог…")
+def get_catalog_manager(path: str) -> CatalogManager:
+    """Каталог и его индекс — один раз на процесс; дельты (CATALOG_DELTA_DIR) применяются в фоне."""
+    manager = CatalogManager(Path(path))
+    manager.start()
+    return manager
+
+
+@st.cache_resource
+def get_image_cache() -> ImageCache:
+    return ImageCache()
+
+
+@st.cache_resource
+def get_feedback_store() -> FeedbackStore:
+    return FeedbackStore(FEEDBACK_PATH, legacy_csv=LEGACY_FEEDBACK_CSV)
 
-df_enriched = df_enriched.drop_duplicates(['image_external_url']).drop_duplicates(['good_id', 'store_id'])
+
+# текущая версия каталога — одна на весь rerun, даже если в это время пришла дельта
+catalog_index: CatalogIndex = get_catalog_manager(str(DEFAULT_DATA_PATH)).current()
+df_enriched = catalog_index.df
 #df_enriched = df_enriched[~df_enriched.image_external_url.str.contains('//imocean.ru/')]
 
 # --- ввод запроса пользователя ---
@@ -73,46 +80,93 @@ use_unisex_choice = st.sidebar.selectbox(
 )
 use_unisex_choice = True if use_unisex_choice == "Можно" else False
 
+with st.sidebar.expander("Метрики этапов"):
+    st.download_button("JSON", REGISTRY.to_json(), file_name="stylist_metrics.json")
+    st.download_button("Prometheus", REGISTRY.to_prometheus(), file_name="stylist_metrics.prom")
+
+look_cache = get_look_cache()
+if look_cache is not None:
+    with st.sidebar.expander("Кэш LLM-ответов"):
+        st.json(look_cache.stats())
+
 # --- обработка запроса ---
 if st.button("Сгенерировать лук"):
-    with st.spinner("Запрашиваем стилиста-ИИ…"):
-        look = generate_look(user_query, model=model_choice)
+    with trace() as request_spans:
+        with st.spinner("Запрашиваем стилиста-ИИ…"):
+            look = generate_look(user_query, model=model_choice)
 
-    st.success("Образ сгенерирован")
-    st.write("### Структура полученного лука")
-    st.json(look.model_dump(), expanded=False)
+        st.success("Образ сгенерирован")
+        st.write("### Структура полученного лука")
+        st.json(look.model_dump(), expanded=False)
 
     
-    # --- фильтрация датасета ---
-    with st.spinner("Подбираем вещи из каталога…"):
-        results = filter_dataset(df_enriched, look, max_per_item=100, use_unisex_choice=use_unisex_choice)
-
-    # --- вывод таблиц ---
-    for part, df_part in results.items():
-        if df_part.empty:
-            st.write(f"_{part}: подходящих вещей не найдено_")
-        else:
-            st.subheader(part.capitalize())
-            st.dataframe(df_part, use_container_width=True)
-
-    # --- визуализация top-2 луков ---
-    st.markdown("### Top-2 total looks")
-    col1, col2 = st.columns(2)
-
-    def show_look(col, idx):
-        with col:
-            st.write(f"#### Look {idx+1}")
+        # --- фильтрация датасета ---
+        with st.spinner("Подбираем вещи из каталога…"):
+            results = filter_dataset(
+                df_enriched, look, max_per_item=100, use_unisex_choice=use_unisex_choice, index=catalog_index
+            )
+
+        with span("assemble_looks"):
+            looks = assemble_looks(results, n_looks=2)
+
+        # качаем в фоне ровно те картинки, что покажут луки, пока рендерятся таблицы
+        image_cache = get_image_cache()
+        image_futures = image_cache.prefetch(
+            row.get("image_external_url") for assembled in looks for row in assembled.items.values()
+        )
+
+        # --- вывод таблиц ---
+        with span("render_tables", candidates=sum(len(df_part) for df_part in results.values())):
             for part, df_part in results.items():
-                if df_part is not None and len(df_part) > idx:
-                    row = df_part.iloc[idx]
+                if df_part.empty:
+                    st.write(f"_{part}: подходящих вещей не найдено_")
+                else:
+                    st.subheader(part.capitalize())
+                    st.dataframe(df_part.drop(columns=list(DERIVED_COLUMNS), errors="ignore"), use_container_width=True)
+
+        # --- визуализация top-2 луков ---
+        st.markdown("### Top-2 total looks")
+        col1, col2 = st.columns(2)
+        # один общий дедлайн на все миниатюры; не успевшие показываем по исходному URL
+        with span("wait_images", pending=len(image_futures)):
+            wait(image_futures, timeout=IMAGE_WAIT_SECONDS)
+
+        def show_look(col, idx):
+            with col, span("show_look") as s:
+                st.write(f"#### Look {idx+1}")
+                if len(looks) <= idx:
+                    st.write("_недостаточно вещей для образа_")
+                    return
+                for part, row in looks[idx].items.items():
                     url = row.get('image_external_url')
                     name = row.get('name', part)
-                    if url:
-                        st.image(url, caption=f"{part}: {name}")
-
-    show_look(col1, 0)
-    show_look(col2, 1)
+                    image = image_cache.path_or_url(url, timeout=0) if url else None
+                    if image:
+                        st.image(image, caption=f"{part}: {name}")
+                s.set(images=len(looks[idx].items))
+
+        show_look(col1, 0)
+        show_look(col2, 1)
+
+    # лук и SKU переживают rerun, который запускает кнопка «Сохранить отзыв»
+    st.session_state["last_request"] = {
+        "user_query": user_query,
+        "model": model_choice,
+        "look": look.model_dump(),
+        "skus": {
+            f"Look {i+1}": [
+                {"slot": slot, "good_id": row.get("good_id"), "store_id": row.get("store_id")}
+                for slot, row in assembled.items.items()
+            ]
+            for i, assembled in enumerate(looks)
+        },
+    }
+
+    with st.expander("Время по этапам запроса"):
+        st.dataframe(pd.DataFrame([s.as_dict() for s in request_spans]), use_container_width=True)
     
+if "last_request" in st.session_state:
+    last = st.session_state["last_request"]
     st.markdown("### Выберите понравившийся образ")
     selected = st.radio(
         "Какой образ вам нравится больше?",
@@ -122,13 +176,12 @@ if st.button("Сгенерировать лук"):
     )
     comment = st.text_input("Комментарий", key="look_comment")
     if st.button("Сохранить отзыв", key="save_feedback"):
-        new_row = {
-            "user_query": user_query,
-            "selected_look": selected,
-            "comment": comment,
-        }
-        users_feedback = pd.concat(
-            [users_feedback, pd.DataFrame([new_row])], ignore_index=True
+        get_feedback_store().add(
+            user_query=last["user_query"],
+            selected_look=selected,
+            comment=comment,
+            model=last["model"],
+            look=last["look"],
+            skus=last["skus"].get(selected, []),
         )
-        users_feedback.to_csv(FEEDBACK_PATH, index=False)
-        st.success("Спасибо за отзыв!")
\ No newline at end of file
+        st.success("Спасибо за отзыв!")
@@ -0,0 +1,176 @@
+# assembler.py
+from __future__ import annotations
+import ast
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from catalog import normalize, normalize_season, tokenize
+from ranking import top_k
+
+
+# Вклад попарной совместимости и исходного ранга кандидата в скор образа
+COMPAT_WEIGHTS: Dict[str, float] = {
+    "color": 1.0,
+    "style": 1.0,
+    "season": 1.0,
+    "rank": 0.5,
+}
+# Цвета, которые сочетаются с любыми другими
+NEUTRAL_COLORS = {"черный", "белый", "серый", "бежевый", "молочный", "кремовый", "графитовый", "айвори"}
+SEASON_CODES = {"": 0, "summer": 1, "demi": 2, "winter": 3}
+
+
+@dataclass
+class AssembledLook:
+    """Собранный образ: по одной строке каталога на каждую позицию лука."""
+    score: float
+    items: Dict[str, pd.Series] = field(default_factory=dict)
+
+
+@dataclass
+class _Slot:
+    key: str
+    df: pd.DataFrame
+    color: np.ndarray      # код цвета (-1 — не указан)
+    neutral: np.ndarray    # нейтральный цвет
+    season: np.ndarray     # код SEASON_CODES
+    style: np.ndarray      # multi-hot по словарю стилей, float32
+    rank: np.ndarray       # априорный скор по порядку выдачи filter_dataset
+    uid: np.ndarray        # идентификатор SKU — одна вещь не может попасть в образ дважды
+
+
+def _as_list(val) -> List[str]:
+    """style из CSV приходит строкой "['casual', ...]", из Parquet — массивом."""
+    if isinstance(val, (list, tuple, np.ndarray)):
+        return [normalize(v) for v in val]
+    text = str(val).strip() if val is not None else ""
+    if text.startswith("["):
+        try:
+            return [normalize(v) for v in ast.literal_eval(text)]
+        except (ValueError, SyntaxError):
+            pass
+    return tokenize(text)
+
+
+def _build_slots(results: Dict[str, pd.DataFrame]) -> List[_Slot]:
+    parts = [(key, df) for key, df in results.items() if df is not None and not df.empty]
+    colors: Dict[str, int] = {}
+    styles: Dict[str, int] = {}
+    raw = []
+    for key, df in parts:
+        color_vals = [(tokenize(c) or [""])[0] for c in df["color"]] if "color" in df.columns else [""] * len(df)
+        style_vals = [_as_list(v) for v in df["style"]] if "style" in df.columns else [[]] * len(df)
+        for c in color_vals:
+            if c:
+                colors.setdefault(c, len(colors))
+        for st in style_vals:
+            for s in st:
+                styles.setdefault(s, len(styles))
+        raw.append((key, df, color_vals, style_vals))
+
+    slots = []
+    for key, df, color_vals, style_vals in raw:
+        n = len(df)
+        style = np.zeros((n, max(len(styles), 1)), dtype=np.float32)
+        for i, st in enumerate(style_vals):
+            style[i, [styles[s] for s in st]] = 1.0
+        seasons = df["season"] if "season" in df.columns else [""] * n
+        uid = (df["good_id"].astype(str) + "|" + df["store_id"].astype(str)).to_numpy() \
+            if {"good_id", "store_id"}.issubset(df.columns) else np.asarray([f"{key}|{i}" for i in range(n)])
+        slots.append(_Slot(
+            key=key,
+            df=df,
+            color=np.asarray([colors.get(c, -1) for c in color_vals], dtype=np.int64),
+            neutral=np.asarray([c in NEUTRAL_COLORS for c in color_vals], dtype=bool),
+            season=np.asarray([SEASON_CODES[normalize_season(s)] for s in seasons], dtype=np.int64),
+            style=style,
+            rank=1.0 - np.arange(n, dtype=np.float64) / n,
+            uid=uid,
+        ))
+    return slots
+
+
+def pair_compatibility(a: _Slot, b: _Slot, weights: Dict[str, float] = COMPAT_WEIGHTS) -> np.ndarray:
+    """
+    Матрица совместимости (len(a) × len(b)) за один векторный проход:
+    цвет (совпадение или нейтральный), пересечение стилей (Жаккар), конфликт сезонов.
+    """
+    same = (a.color[:, None] == b.color[None, :]) & (a.color[:, None] >= 0)
+    neutral = a.neutral[:, None] | b.neutral[None, :]
+    color = np.where(same, 1.0, np.where(neutral, 0.5, 0.0))
+
+    inter = a.style @ b.style.T
+    union = a.style.sum(1)[:, None] + b.style.sum(1)[None, :] - inter
+    style = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+    # лето с зимой не сочетаются; демисезон и неизвестный сезон — нейтральны
+    sa, sb = a.season[:, None], b.season[None, :]
+    season = -(((sa == 1) & (sb == 3)) | ((sa == 3) & (sb == 1))).astype(np.float64)
+
+    compat = weights["color"] * color + weights["style"] * style + weights["season"] * season
+    compat[a.uid[:, None] == b.uid[None, :]] = -np.inf
+    return compat
+
+
+def assemble_looks(
+    results: Dict[str, pd.DataFrame],
+    n_looks: int = 2,
+    beam_width: int = 32,
+    time_budget: float = 0.25,
+    weights: Dict[str, float] = COMPAT_WEIGHTS,
+) -> List[AssembledLook]:
+    """
+    Beam search по кандидатам filter_dataset: на каждом шаге к каждому частичному образу
+    добавляется вещь следующей позиции, скор = ранг вещей + попарная совместимость со всем
+    уже выбранным. Ширина луча ограничена `beam_width`; когда `time_budget` (сек) исчерпан,
+    оставшиеся позиции достраиваются жадно (луч шириной n_looks).
+    Возвращает до `n_looks` лучших полных образов с разными наборами SKU.
+    """
+    slots = _build_slots(results)
+    if not slots:
+        return []
+
+    started = time.perf_counter()
+    pairs: Dict[Tuple[int, int], np.ndarray] = {}
+
+    # луч: массив выбранных индексов (beam × шаг) и их скоры
+    first = slots[0]
+    beam_choice = top_k(weights["rank"] * first.rank, beam_width)[:, None]
+    beam_score = weights["rank"] * first.rank[beam_choice[:, 0]]
+
+    for step in range(1, len(slots)):
+        slot = slots[step]
+        width = beam_width if time.perf_counter() - started < time_budget else n_looks
+
+        # скор расширения: (beam × кандидаты) — ранг + совместимость со всеми предыдущими шагами
+        expand = beam_score[:, None] + weights["rank"] * slot.rank[None, :]
+        for prev in range(step):
+            if (prev, step) not in pairs:
+                pairs[(prev, step)] = pair_compatibility(slots[prev], slot, weights)
+            expand = expand + pairs[(prev, step)][beam_choice[:, prev]]
+
+        flat = expand.ravel()
+        best = top_k(flat, width)
+        best = best[np.isfinite(flat[best])]
+        beam_rows, cand = np.divmod(best, len(slot.df))
+        beam_choice = np.column_stack([beam_choice[beam_rows], cand])
+        beam_score = flat[best]
+        if not len(beam_score):
+            return []
+
+    # образы из того же набора SKU, разложенного по позициям иначе, — не новый образ
+    looks, seen = [], set()
+    for choice, score in zip(beam_choice, beam_score):
+        skus = frozenset(slot.uid[i] for slot, i in zip(slots, choice))
+        if skus in seen:
+            continue
+        seen.add(skus)
+        items = {slot.key: slot.df.iloc[i] for slot, i in zip(slots, choice)}
+        looks.append(AssembledLook(score=float(score), items=items))
+        if len(looks) == n_looks:
+            break
+    return looks
@@ -0,0 +1,6 @@
+"""Offline benchmarks for the matching path (no API key needed).
+
+Run from the repository root::
+
+    python -m bench.run --rows 10000 100000 1000000
+"""
@@ -0,0 +1,72 @@
+"""Fixed corpus of looks used by the benchmarks (mirrors typical LLM output)."""
+
+from __future__ import annotations
+
+from typing import List
+
+from prompts import Item, OneTotalLook
+
+
+def _look(sex, season, **parts) -> OneTotalLook:
+    return OneTotalLook(
+        sex=sex,
+        season=season,
+        **{part: [Item(**itm) for itm in items] for part, items in parts.items()},
+    )
+
+
+LOOKS: List[OneTotalLook] = [
+    _look("female", "летний",
+          full=[{"category": "платье", "color": "розовый", "fabric": "шелк", "pattern": "цветы"}],
+          shoes=[{"category": "босоножки", "color": "бежевый"}],
+          accessories=[{"category": "сумка", "color": "белый", "fabric": "кожа"}]),
+    _look("female", "демисезонный",
+          top=[{"category": "блузка", "color": "белый", "fabric": "шелк"}],
+          bottom=[{"category": "брюки", "color": "черный", "fabric": "шерсть"}],
+          shoes=[{"category": "туфли", "color": "черный", "fabric": "кожа"}],
+          outerwear=[{"category": "жакет", "color": "серый", "pattern": "клетка"}]),
+    _look("male", "зимний",
+          top=[{"category": "свитер", "color": "серый", "fabric": "шерсть"}],
+          bottom=[{"category": "джинсы", "color": "синий"}],
+          shoes=[{"category": "ботинки", "color": "коричневый", "fabric": "замша"}],
+          outerwear=[{"category": "пальто", "color": "черный", "fabric": "кашемир"}],
+          accessories=[{"category": "шарф", "color": "серый"}]),
+    _look("unisex", "летний",
+          top=[{"category": "футболка", "color": "белый"}],
+          bottom=[{"category": "джинсы", "color": "голубой"}],
+          shoes=[{"category": "кроссовки", "color": "белый"}]),
+    _look("female", "весенний",
+          top=[{"category": "рубашка", "color": "светлый", "fabric": "лен"}],
+          bottom=[{"category": "юбка", "color": "бежевый", "pattern": "полоска", "detailes": "пуговицы"}],
+          shoes=[{"category": "туфли", "color": "бежевый"}],
+          accessories=[{"category": "ремень", "color": "коричневый"}, {"category": "сумка", "color": "темный"}]),
+    _look("male", "летний",
+          top=[{"category": "рубашка", "color": "голубой", "fabric": "хлопок", "pattern": "полоска"}],
+          bottom=[{"category": "брюки", "color": "бежевый", "fabric": "лен"}],
+          shoes=[{"category": "туфли", "color": "коричневый"}]),
+    _look("female", "зимний",
+          full=[{"category": "платье", "color": "бордовый", "fabric": "трикотаж"}],
+          shoes=[{"category": "ботинки", "color": "черный", "fabric": "кожа", "detailes": "молния"}],
+          outerwear=[{"category": "пальто", "color": "бежевый", "fabric": "шерсть"}]),
+    _look("female", "осенний",
+          top=[{"category": "свитер", "color": "зеленый"}],
+          bottom=[{"category": "юбка", "color": "коричневый", "fabric": "кожа"}],
+          shoes=[{"category": "ботинки", "color": "черный"}],
+          outerwear=[{"category": "куртка", "color": "черный", "fabric": "кожа"}]),
+]
+
+# Recorded-style user requests for the replayer (bench.replay) when no feedback log is given
+QUERIES: List[str] = [
+    "летний образ на прогулку по городу",
+    "что надеть в офис осенью",
+    "мужской образ на зиму, тепло и удобно",
+    "платье на свадьбу подруги летом",
+    "повседневный look в стиле casual",
+    "романтичное свидание весной",
+    "образ для собеседования, мужской",
+    "отпуск на море",
+    "вечеринка в пятницу вечером",
+    "уютный образ на выходные дома и в кафе",
+    "деловая встреча зимой",
+    "концерт под открытым небом",
+]
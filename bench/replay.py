@@ -0,0 +1,148 @@
+"""Load-test replayer: drives user queries through the request path at a target QPS.
+
+The LLM is replaced by the deterministic stub backend (``llm_backend.StubBackend``)
+with a configurable latency distribution, so no API key or network is needed.
+Requests are open-loop (arrival times fixed by ``--qps``), and the report separates
+end-to-end latency from the non-LLM part (matching, ranking, assembly, queueing)::
+
+    python -m bench.replay --rows 100k --qps 20 --requests 400
+    python -m bench.replay --catalog data/clothes_enriched_new_cat1_only.parquet \\
+        --queries data/users_feedback.sqlite --qps 50 --latency lognormal:0.8:0.4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from assembler import assemble_looks  # noqa: E402
+from bench.fixtures import LOOKS, QUERIES  # noqa: E402
+from bench.run import peak_rss_mb  # noqa: E402
+from bench.synthetic import catalog_sizes, generate_catalog  # noqa: E402
+from catalog import CatalogIndex, load_catalog  # noqa: E402
+from feedback_store import FeedbackStore  # noqa: E402
+from llm_backend import StubBackend  # noqa: E402
+from stylist_core import agenerate_look, filter_dataset, set_backend  # noqa: E402
+from telemetry import REGISTRY, span, trace  # noqa: E402
+
+
+def load_queries(path: Optional[Path]) -> List[str]:
+    """Queries from a feedback DB (.sqlite), a CSV with ``user_query``, or a text file (one per line)."""
+    if path is None:
+        return list(QUERIES)
+    if path.suffix in (".sqlite", ".db"):
+        column = FeedbackStore(path).read()["user_query"]
+    elif path.suffix == ".csv":
+        column = pd.read_csv(path)["user_query"]
+    else:
+        column = pd.Series(path.read_text(encoding="utf-8").splitlines())
+    queries = [q for q in column.fillna("").astype(str).str.strip() if q]
+    if not queries:
+        raise SystemExit(f"No queries found in {path}")
+    return queries
+
+
+def quantiles(samples: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "n": len(ms),
+    }
+
+
+async def replay(
+    index: CatalogIndex,
+    queries: List[str],
+    qps: float,
+    n_requests: int,
+    workers: int = 8,
+    max_per_item: int = 50,
+    n_looks: int = 2,
+) -> Dict[str, Any]:
+    """Open-loop replay; matching and assembly run in a shared thread pool as in service.py."""
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay-worker"))
+    REGISTRY.reset()
+    per_stage: Dict[str, List[float]] = defaultdict(list)
+    started_at = loop.time()
+
+    async def one(i: int):
+        await asyncio.sleep(max(0.0, started_at + i / qps - loop.time()))
+        t = time.perf_counter()
+        with trace() as spans:
+            look = await agenerate_look(queries[i % len(queries)], use_cache=False)
+            # to_thread копирует контекст, поэтому спаны из пула попадают в trace запроса
+            results = await asyncio.to_thread(filter_dataset, index.df, look, max_per_item=max_per_item, index=index)
+            with span("assemble_looks"):
+                await asyncio.to_thread(assemble_looks, results, n_looks=n_looks)
+        total = time.perf_counter() - t
+        for s in spans:
+            per_stage[s.stage].append(s.seconds)
+        llm = sum(s.seconds for s in spans if s.stage == "llm_call")
+        return total, total - llm
+
+    samples = await asyncio.gather(*(one(i) for i in range(n_requests)))
+    elapsed = loop.time() - started_at
+    return {
+        "requests": n_requests,
+        "offered_qps": qps,
+        "achieved_qps": n_requests / elapsed,
+        "elapsed_s": elapsed,
+        "end_to_end": quantiles([total for total, _ in samples]),
+        "non_llm": quantiles([rest for _, rest in samples]),
+        "stages": {stage: quantiles(values) for stage, values in sorted(per_stage.items())},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--rows", default="100k", help="synthetic catalog size, e.g. 10k, 1M")
+    source.add_argument("--catalog", type=Path, help="real catalog (.parquet artifact or .csv)")
+    parser.add_argument("--queries", type=Path, help="feedback .sqlite, CSV with user_query, or text file")
+    parser.add_argument("--qps", type=float, default=10.0, help="target arrival rate")
+    parser.add_argument("--requests", type=int, default=200, help="number of requests to replay")
+    parser.add_argument("--latency", default="lognormal:0.8:0.4", help="stub LLM latency: const:s | uniform:a:b | lognormal:median:sigma")
+    parser.add_argument("--seed", type=int, default=0, help="stub seed (fixes responses and latencies)")
+    parser.add_argument("--workers", type=int, default=8, help="thread pool size for matching/assembly")
+    parser.add_argument("--json", type=Path, help="also write the report to this file")
+    args = parser.parse_args()
+
+    if args.catalog is not None:
+        index = CatalogIndex(load_catalog(args.catalog))
+    else:
+        index = CatalogIndex(generate_catalog(catalog_sizes([args.rows])[0]))
+    set_backend(StubBackend(latency=args.latency, seed=args.seed, canned={"OneTotalLook": LOOKS}))
+
+    report = asyncio.run(replay(index, load_queries(args.queries), args.qps, args.requests, workers=args.workers))
+    report.update(catalog_rows=index.n_rows, latency=args.latency, peak_rss_mb=peak_rss_mb())
+
+    e2e, rest = report["end_to_end"], report["non_llm"]
+    print(
+        f"{index.n_rows:,} rows | {report['requests']} requests @ {args.qps:g} qps offered, "
+        f"{report['achieved_qps']:.1f} achieved | end-to-end p50 {e2e['p50_ms']:.0f}ms p99 {e2e['p99_ms']:.0f}ms | "
+        f"non-LLM p50 {rest['p50_ms']:.1f}ms p95 {rest['p95_ms']:.1f}ms p99 {rest['p99_ms']:.1f}ms"
+    )
+    for stage, q in report["stages"].items():
+        print(f"  {stage:<16} n={q['n']:<6} p50 {q['p50_ms']:8.2f}ms  p95 {q['p95_ms']:8.2f}ms  p99 {q['p99_ms']:8.2f}ms")
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Timing / memory benchmarks for match_item and filter_dataset.
+
+Each catalog size runs in a fresh process so peak RSS is per size::
+
+    python -m bench.run --rows 10k 100k 1M --repeat 5
+    python -m bench.run --rows 100k --json bench_output.json
+    python -m bench.run --rows 1M --shards 8      # plus the multi-process sharded matcher
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.fixtures import LOOKS  # noqa: E402
+from bench.synthetic import catalog_sizes, generate_catalog  # noqa: E402
+from catalog import CatalogIndex  # noqa: E402
+from sharded import ShardedMatcher  # noqa: E402
+from stylist_core import filter_dataset, filter_datasets, match_item  # noqa: E402
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000.0
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)), "n": len(ms)}
+
+
+def bench_size(n_rows: int, repeat: int = 5, max_per_item: int = 100, shards: int = 0) -> Dict[str, Any]:
+    """Benchmark one catalog size: index build, per-item and per-look latency, batch throughput."""
+    out: Dict[str, Any] = {"rows": n_rows}
+
+    t = time.perf_counter()
+    df = generate_catalog(n_rows)
+    out["generate_s"] = time.perf_counter() - t
+    out["rss_after_generate_mb"] = peak_rss_mb()
+
+    t = time.perf_counter()
+    index = CatalogIndex(df)
+    out["index_build_s"] = time.perf_counter() - t
+    out["rss_after_index_mb"] = peak_rss_mb()
+
+    # warm-up: first call fills the index query cache, which production also keeps
+    filter_dataset(df, LOOKS[0], max_per_item=max_per_item, index=index)
+
+    per_look, per_item = [], []
+    for _ in range(repeat):
+        for look in LOOKS:
+            t = time.perf_counter()
+            filter_dataset(df, look, max_per_item=max_per_item, index=index)
+            per_look.append(time.perf_counter() - t)
+            for part in ("top", "bottom", "full", "shoes", "outerwear", "accessories"):
+                for itm in getattr(look, part) or []:
+                    t = time.perf_counter()
+                    match_item(df, itm, index=index)
+                    per_item.append(time.perf_counter() - t)
+    out["filter_dataset"] = percentiles(per_look)
+    out["match_item"] = percentiles(per_item)
+
+    batch = LOOKS * repeat
+    t = time.perf_counter()
+    filter_datasets(df, batch, max_per_item=max_per_item, index=index)
+    elapsed = time.perf_counter() - t
+    out["filter_datasets"] = {"looks": len(batch), "total_s": elapsed, "looks_per_s": len(batch) / elapsed}
+
+    if shards:
+        t = time.perf_counter()
+        with ShardedMatcher(index, n_shards=shards) as matcher:
+            out["shards_start_s"] = time.perf_counter() - t
+            per_look = []
+            for _ in range(repeat):
+                for look in LOOKS:
+                    t = time.perf_counter()
+                    filter_dataset(df, look, max_per_item=max_per_item, matcher=matcher)
+                    per_look.append(time.perf_counter() - t)
+            out["filter_dataset_sharded"] = {**percentiles(per_look), "shards": shards}
+
+    out["peak_rss_mb"] = peak_rss_mb()
+    return out
+
+
+def _run_isolated(n_rows: int, repeat: int, shards: int) -> Dict[str, Any]:
+    # не mp.Pool: его процессы-демоны не могут запускать шарды ShardedMatcher
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+        return pool.submit(bench_size, n_rows, repeat, shards=shards).result()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", nargs="+", default=["10k", "100k"], help="catalog sizes, e.g. 10k 100k 1M")
+    parser.add_argument("--repeat", type=int, default=5, help="passes over the look corpus")
+    parser.add_argument("--shards", type=int, default=0, help="also time filter_dataset on N shard processes")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for n_rows in catalog_sizes(args.rows):
+        res = _run_isolated(n_rows, args.repeat, args.shards)
+        results.append(res)
+        print(
+            f"{n_rows:>9,} rows | index {res['index_build_s']:.2f}s | "
+            f"look p50 {res['filter_dataset']['p50_ms']:.1f}ms p95 {res['filter_dataset']['p95_ms']:.1f}ms | "
+            f"item p50 {res['match_item']['p50_ms']:.2f}ms p95 {res['match_item']['p95_ms']:.2f}ms | "
+            f"batch {res['filter_datasets']['looks_per_s']:.0f} looks/s | peak RSS {res['peak_rss_mb']:.0f} MB"
+        )
+        if "filter_dataset_sharded" in res:
+            sharded = res["filter_dataset_sharded"]
+            print(
+                f"{'':>9}      | {sharded['shards']} shards, start {res['shards_start_s']:.1f}s | "
+                f"look p50 {sharded['p50_ms']:.1f}ms p95 {sharded['p95_ms']:.1f}ms"
+            )
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
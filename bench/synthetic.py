@@ -0,0 +1,96 @@
+"""Synthetic catalog generator mimicking the enriched catalog columns."""
+
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+# category → (parent category, typical fabrics)
+CATEGORIES = {
+    "платье": ("одежда", ["шелк", "хлопок", "вискоза", "трикотаж"]),
+    "юбка": ("одежда", ["хлопок", "деним", "шерсть", "кожа"]),
+    "брюки": ("одежда", ["шерсть", "хлопок", "лен", "вискоза"]),
+    "джинсы": ("одежда", ["деним"]),
+    "блузка": ("одежда", ["шелк", "хлопок", "шифон"]),
+    "рубашка": ("одежда", ["хлопок", "лен"]),
+    "футболка": ("одежда", ["хлопок", "трикотаж"]),
+    "свитер": ("одежда", ["шерсть", "кашемир", "трикотаж"]),
+    "жакет": ("одежда", ["шерсть", "твид", "лен"]),
+    "пальто": ("верхняя одежда", ["шерсть", "кашемир"]),
+    "куртка": ("верхняя одежда", ["кожа", "нейлон", "деним"]),
+    "туфли": ("обувь", ["кожа", "замша"]),
+    "кроссовки": ("обувь", ["текстиль", "кожа"]),
+    "ботинки": ("обувь", ["кожа", "замша"]),
+    "босоножки": ("обувь", ["кожа"]),
+    "сумка": ("аксессуары", ["кожа", "текстиль"]),
+    "ремень": ("аксессуары", ["кожа"]),
+    "шарф": ("аксессуары", ["шерсть", "шелк"]),
+}
+# color word → representative HSL
+COLORS = {
+    "черный": (0, 0, 8), "белый": (0, 0, 97), "серый": (0, 0, 50), "бежевый": (35, 40, 80),
+    "красный": (0, 80, 45), "розовый": (340, 80, 80), "синий": (225, 70, 35), "голубой": (200, 70, 70),
+    "зеленый": (120, 55, 40), "желтый": (52, 90, 55), "коричневый": (25, 50, 30), "фиолетовый": (275, 55, 40),
+}
+PATTERNS = ["", "", "", "клетка", "полоска", "горох", "цветы", "принт"]
+DETAILES = ["", "", "", "рюши", "пуговицы", "карманы", "пояс", "молния"]
+ADJECTIVES = ["", "", "базовый", "оверсайз", "приталенный", "укороченный", "удлиненный", "классический"]
+SEASONS = ["summer", "demi", "winter"]
+STYLES = ["casual", "romantic", "classic", "boho", "military", "smart-casual", "drama"]
+
+
+def generate_catalog(n_rows: int, seed: int = 0, enriched: bool = True) -> pd.DataFrame:
+    """
+    Build a catalog of ``n_rows`` rows with the real column layout:
+    ``name``, ``category_id`` (list), ``color``, ``gender``, ``detailes``,
+    ``image_external_url``, ``good_id``, ``store_id`` and, with ``enriched``,
+    the extracted ``color_hsl``, ``season``, ``style`` and ``confidence``.
+    """
+    rng = np.random.default_rng(seed)
+    cats = np.array(list(CATEGORIES))
+    colors = np.array(list(COLORS))
+
+    cat = rng.choice(cats, n_rows)
+    color = rng.choice(colors, n_rows)
+    pattern = rng.choice(PATTERNS, n_rows)
+    adjective = rng.choice(ADJECTIVES, n_rows)
+    fabric = np.empty(n_rows, dtype=object)
+    for c, (_, fabrics) in CATEGORIES.items():
+        rows = cat == c
+        fabric[rows] = rng.choice(fabrics, rows.sum())
+
+    # "Платье шелк красный клетка" — capitalized category as in real catalog names
+    name = (
+        pd.Series(cat).str.capitalize() + " " + adjective + " " + fabric + " " + color + " " + pattern
+    ).str.split().str.join(" ")
+
+    df = pd.DataFrame({
+        "name": name,
+        "category_id": [[c, CATEGORIES[c][0]] for c in cat],
+        # some rows keep the colour only in the name, like the real data
+        "color": np.where(rng.random(n_rows) < 0.8, color, ""),
+        "gender": rng.choice(["female", "male", "unisex"], n_rows, p=[0.6, 0.3, 0.1]),
+        "detailes": rng.choice(DETAILES, n_rows),
+        "image_external_url": [f"https://cdn.example.com/img/{i}.jpg" for i in range(n_rows)],
+        "good_id": np.arange(n_rows, dtype=np.int64) + 100_000,
+        "store_id": rng.integers(1, 40, n_rows),
+    })
+    if enriched:
+        jitter = rng.normal(0, [8, 8, 6], (n_rows, 3))
+        hsl = np.array([COLORS[c] for c in color], dtype=np.float64) + jitter
+        hsl[:, 0] %= 360
+        hsl[:, 1:] = np.clip(hsl[:, 1:], 0, 100)
+        df["color_hsl"] = [[triple] for triple in np.round(hsl).astype(int).tolist()]
+        df["season"] = rng.choice(SEASONS, n_rows)
+        df["style"] = [list(s) for s in rng.choice(STYLES, (n_rows, 2))]
+        df["confidence"] = np.round(rng.uniform(0.4, 1.0, n_rows), 2)
+    return df
+
+
+def catalog_sizes(spec: List[str]) -> List[int]:
+    """'10k' / '1M' / '250000' → row counts."""
+    mult = {"k": 1_000, "m": 1_000_000}
+    return [int(float(s[:-1]) * mult[s[-1].lower()]) if s[-1].lower() in mult else int(s) for s in spec]
@@ -0,0 +1,502 @@
+# catalog.py
+from __future__ import annotations
+import argparse
+import ast
+import copy
+import os
+import re
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import snowballstemmer
+
+from color_index import ColorIndex, parse_hsl
+
+
+SUPPORTED_EXT = {".parquet", ".csv"}
+DATA_DIR = Path(__file__).resolve().parent / "data"
+# Parquet-артефакт собирается командой `python catalog.py build <csv> <parquet>`
+DEFAULT_CATALOG_ARTIFACT = DATA_DIR / "clothes_enriched_new_cat1_only.parquet"
+DEFAULT_CATALOG_CSV = DATA_DIR / "clothes_enriched_new_cat1_only.csv"
+# Колонки с малым числом уникальных значений храним как category
+CATEGORICAL_COLUMNS = ("gender", "color", "meta_category")
+# Производные колонки артефакта, посчитанные при сборке (в UI не показываются)
+DERIVED_COLUMNS = ("name_stems", "color_stems", "detailes_stems", "category0")
+# Поля, по которым строятся основы слов (при сборке артефакта и в индексе)
+STEM_FIELDS = ("name", "color", "detailes")
+
+_TOKEN_RE = re.compile(r"\w+")
+_EMPTY = np.empty(0, dtype=np.int64)
+_STEMMER = snowballstemmer.stemmer("russian")
+
+
+# ---------- нормализация ----------
+def normalize(text) -> str:
+    """Приводит значение ячейки к нижнему регистру; NaN/None → пустая строка."""
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return ""
+    return str(text).lower().replace("ё", "е")
+
+
+def tokenize(text) -> List[str]:
+    """Разбивает текст на нормализованные токены (буквы/цифры)."""
+    return _TOKEN_RE.findall(normalize(text))
+
+
+@lru_cache(maxsize=200_000)
+def stem(token: str) -> str:
+    """Основа слова (Snowball, русский): «платье/платья» → «плат»; латиница и числа не меняются."""
+    return _STEMMER.stemWord(token)
+
+
+def stem_tokens(text) -> List[str]:
+    """
+    Нормализатор матчинга: нижний регистр, ё → е, без пунктуации, основы слов.
+    Одинаково применяется к колонкам каталога и к полям Item из LLM.
+    """
+    return [stem(tok) for tok in tokenize(text)]
+
+
+def stem_key(text) -> str:
+    """Значение целиком как один ключ точного сравнения (category_id[0])."""
+    return " ".join(stem_tokens(text))
+
+
+# Сезон из лука (по-русски) и из извлеченных признаков (summer | demi | winter)
+SEASON_PREFIXES = {
+    "лет": "summer", "summer": "summer",
+    "зим": "winter", "winter": "winter",
+    "вес": "demi", "осен": "demi", "демис": "demi", "demi": "demi",
+    "spring": "demi", "autumn": "demi", "fall": "demi",
+}
+
+
+def normalize_season(text) -> str:
+    """Сводит сезон к summer | demi | winter; неизвестное значение → пустая строка."""
+    value = normalize(text).strip()
+    for prefix, season in SEASON_PREFIXES.items():
+        if value.startswith(prefix):
+            return season
+    return ""
+
+
+def first_category(val) -> str:
+    """category_id хранится списком, для матчинга нужен только первый элемент."""
+    if isinstance(val, (list, tuple, np.ndarray)) and len(val):
+        return normalize(val[0])
+    return ""
+
+
+# ---------- загрузка каталога ----------
+def to_list(val):
+    """
+    Преобразует строку-представление списка в настоящий список.
+    Оставляет без изменений NaN, пустые ячейки и уже готовые списки.
+    """
+    if pd.isna(val) or isinstance(val, list) or not str(val).strip():
+        return val
+    return ast.literal_eval(val)   # безопасный eval для литералов
+
+
+def read_catalog_csv(path) -> pd.DataFrame:
+    """Исходный CSV каталога: парсинг category_id, fillna и дедупликация."""
+    df = pd.read_csv(path, converters={"category_id": to_list})
+    df = df.fillna("")
+    return df.drop_duplicates(["image_external_url"]).drop_duplicates(["good_id", "store_id"])
+
+
+def build_catalog(csv_in, out_path) -> pd.DataFrame:
+    """
+    Собирает типизированный Parquet-артефакт каталога из CSV:
+    category_id — нативный list<string>, низкокардинальные колонки — category,
+    плюс основы слов name/color/detailes (см. stem_tokens) и первая категория.
+    """
+    df = prepare_catalog(read_catalog_csv(csv_in).reset_index(drop=True))
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(out_path, engine="pyarrow", index=False)
+    return df
+
+
+def prepare_catalog(df: pd.DataFrame) -> pd.DataFrame:
+    """Типы и производные колонки артефакта; общий шаг для полной сборки и для дельт (см. catalog_manager)."""
+    df = df.copy()
+    df["category_id"] = [
+        [str(c) for c in v] if isinstance(v, (list, tuple, np.ndarray)) else [] for v in df["category_id"]
+    ]
+    for field in STEM_FIELDS:
+        df[f"{field}_stems"] = [stem_tokens(v) for v in df[field]] if field in df.columns else [[]] * len(df)
+    df["category0"] = [first_category(v) for v in df["category_id"]]
+    if "color_hsl" in df.columns:
+        df["color_hsl"] = [parse_hsl(v) for v in df["color_hsl"]]
+
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype(str).astype("category")
+        elif col not in DERIVED_COLUMNS and col not in ("category_id", "color_hsl") and df[col].dtype == object:
+            # после fillna("") числовые колонки с пропусками становятся смешанными
+            df[col] = df[col].astype(str)
+    return df
+
+
+def catalog_keys(df: pd.DataFrame) -> pd.Index:
+    """Ключ товара good_id + store_id строкой (типы колонок в артефакте и в дельте могут различаться)."""
+    return pd.Index(df["good_id"].astype(str) + "|" + df["store_id"].astype(str))
+
+
+def default_catalog_path() -> Path:
+    """DATA_PATH из окружения; иначе Parquet-артефакт, а если его нет — исходный CSV."""
+    path = os.getenv("DATA_PATH")
+    if path:
+        return Path(path).expanduser()
+    return DEFAULT_CATALOG_ARTIFACT if DEFAULT_CATALOG_ARTIFACT.exists() else DEFAULT_CATALOG_CSV
+
+
+def load_catalog(path) -> pd.DataFrame:
+    """
+    Загружает каталог: Parquet-артефакт через memory map; CSV проходит те же шаги, что
+    и при сборке артефакта (prepare_catalog), чтобы база и дельты имели одинаковые колонки.
+    """
+    path = Path(path)
+    if path.suffix not in SUPPORTED_EXT:
+        raise ValueError(f"Unsupported catalog format: {path.suffix} (expected one of {SUPPORTED_EXT})")
+    if path.suffix == ".csv":
+        return prepare_catalog(read_catalog_csv(path).reset_index(drop=True))
+
+    import pyarrow.parquet as pq
+    return pq.read_table(path, memory_map=True).to_pandas()
+
+
+# ---------- индекс ----------
+class CatalogIndex:
+    """
+    Инвертированный индекс каталога: основа слова → отсортированный массив позиций строк.
+    Строится один раз при загрузке; фильтры match_item сводятся к точному поиску основ
+    и пересечению массивов вместо построчного str.contains по всему каталогу.
+
+    Версия с дельтой (см. patched) состоит из базового сегмента, общего для всех версий,
+    маски удаленных базовых строк и небольшого сегмента изменений; позиции строк дельты
+    идут после базовых, поэтому запросы возвращают все так же отсортированные массивы.
+    """
+
+    MAX_CACHED_QUERIES = 4096
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.n_rows = len(df)
+        self.version = 0
+
+        # основы слов name / color / detailes (из артефакта, если они уже посчитаны при сборке)
+        self._postings: Dict[str, Dict[str, np.ndarray]] = {}
+        for field in STEM_FIELDS:
+            if f"{field}_stems" in df.columns:
+                token_lists = df[f"{field}_stems"]
+            elif field in df.columns:
+                token_lists = (stem_tokens(v) for v in df[field])
+            else:
+                token_lists = [[]] * self.n_rows
+            self._postings[field] = _build_postings(token_lists)
+
+        # точные значения category_id[0] (в виде основ) и сезона
+        if "category0" in df.columns:
+            categories = ([stem_key(v)] for v in df["category0"])
+        else:
+            categories = ([stem_key(first_category(v))] for v in df["category_id"])
+        self._values: Dict[str, Dict[str, np.ndarray]] = {
+            "category": _build_postings(categories),
+            "season": _build_postings(
+                [normalize_season(v)] for v in df["season"]
+            ) if "season" in df.columns else {},
+        }
+
+        # срезы по полу: female / male / unisex и их объединения с unisex — один раз при загрузке
+        self._genders: Dict[tuple, np.ndarray] = {}
+        if "gender" in df.columns:
+            partitions = _build_postings([normalize(v).strip()] for v in df["gender"])
+            unisex = partitions.get("unisex", _EMPTY)
+            for gender, ids in partitions.items():
+                self._genders[(gender, False)] = _frozen(ids)
+                self._genders[(gender, True)] = _frozen(np.union1d(ids, unisex))
+
+        # цвета из извлеченных признаков (color_hsl) в пространстве Lab
+        self.colors: Optional[ColorIndex] = (
+            ColorIndex.from_values(df["color_hsl"]) if "color_hsl" in df.columns else None
+        )
+
+        # уверенность экстрактора признаков — вход ранжирования
+        self.confidence: Optional[np.ndarray] = (
+            pd.to_numeric(df["confidence"], errors="coerce").fillna(0.0).to_numpy(np.float32)
+            if "confidence" in df.columns else None
+        )
+
+        # коды URL картинок — для дедупликации без материализации DataFrame
+        self.url_codes, self._url_uniques = pd.factorize(df["image_external_url"])
+        self._cache: Dict[tuple, np.ndarray] = {}
+
+        self._init_segments()
+
+    def _init_segments(self) -> None:
+        """Сегмент изменений пуст; заполняется в patched."""
+        self._n_base = self.n_rows
+        self._keys: Optional[pd.Index] = None          # ключи базовых строк, строятся при первой дельте
+        self._dead: Optional[np.ndarray] = None        # удаленные/замененные базовые строки
+        self._delta: Optional[CatalogIndex] = None
+        self._delta_url_codes = _EMPTY
+
+    @classmethod
+    def from_parts(
+        cls,
+        n_rows: int,
+        families: Dict[str, Dict],
+        colors: Optional[ColorIndex],
+        confidence: Optional[np.ndarray],
+        url_codes: np.ndarray,
+    ) -> "CatalogIndex":
+        """
+        Индекс без DataFrame из готовых постингов (см. posting_families) — так шард каталога
+        поднимается в процессе-воркере поверх разделяемой памяти; take() у такого индекса нет.
+        """
+        index = cls.__new__(cls)
+        index.df = None
+        index.n_rows = n_rows
+        index.version = 0
+        index._postings = {field: families[field] for field in STEM_FIELDS}
+        index._values = {"category": families["category"], "season": families["season"]}
+        index._genders = families["gender"]
+        index.colors = colors
+        index.confidence = confidence
+        index.url_codes, index._url_uniques = url_codes, None
+        index._cache = {}
+        index._init_segments()
+        return index
+
+    # --- запросы ---
+    def token_rows(self, field: str, query: Optional[str]) -> np.ndarray:
+        """
+        Позиции строк, где `field` содержит все основы слов `query` (см. stem_tokens):
+        «Платья» находит «платье», поиск — точный по словарю основ, без скана подстрок.
+        """
+        return self._merge(self._token_rows(field, query), lambda d: d.token_rows(field, query))
+
+    def color_rows(self, query: Optional[str]) -> np.ndarray:
+        """
+        Позиции строк цвета `query`: совпадение основ в колонке color плюс, если в каталоге есть
+        color_hsl, попадание в область цветового слова (или диапазон светлоты для
+        «светлый/темный») в ColorIndex.
+        """
+        return self._merge(self._color_rows(query), lambda d: d.color_rows(query))
+
+    def category_rows(self, value: Optional[str]) -> np.ndarray:
+        """Позиции строк, где category_id[0] совпадает с `value` с точностью до основ слов."""
+        return self._merge(
+            self._values["category"].get(stem_key(value), _EMPTY), lambda d: d.category_rows(value)
+        )
+
+    def gender_rows(self, sex: Optional[str], use_unisex: bool = True) -> Optional[np.ndarray]:
+        """
+        Позиции строк пола `sex` (с unisex, если `use_unisex`) — готовый массив из индекса,
+        без прохода по каталогу; None — пол не задан, без ограничения.
+        Массивы общие для всех запросов и доступны только на чтение.
+        """
+        if not sex:
+            return None
+        key = normalize(sex).strip()
+        rows = self._genders.get((key, use_unisex))
+        if rows is None:                   # пол, которого нет в каталоге
+            rows = self._genders.get(("unisex", False), _EMPTY) if use_unisex else _EMPTY
+        return self._merge(rows, lambda d: d.gender_rows(sex, use_unisex))
+
+    def season_rows(self, season: Optional[str]) -> np.ndarray:
+        """Позиции строк, чей сезон совпадает с сезоном лука."""
+        key = normalize_season(season)
+        rows = self._values["season"].get(key, _EMPTY) if key else _EMPTY
+        return self._merge(rows, lambda d: d.season_rows(season))
+
+    def take(self, positions: np.ndarray) -> pd.DataFrame:
+        """Единственная материализация: позиции → строки каталога (в порядке `positions`)."""
+        if self._delta is None:
+            return self.df.iloc[positions]
+        in_delta = positions >= self._n_base
+        if not in_delta.any():
+            return self.df.iloc[positions]
+        rows = pd.concat([self.df.iloc[positions[~in_delta]], self._delta.df.iloc[positions[in_delta] - self._n_base]])
+        order = np.argsort(np.concatenate([np.flatnonzero(~in_delta), np.flatnonzero(in_delta)]), kind="stable")
+        return rows.iloc[order]
+
+    def confidence_at(self, positions: np.ndarray) -> Optional[np.ndarray]:
+        """Уверенность экстрактора для позиций; None — в каталоге нет колонки confidence."""
+        if self.confidence is None:
+            return None
+        if self._delta is None:
+            return self.confidence[positions]
+        delta = self._delta.confidence if self._delta.confidence is not None else np.zeros(self._delta.n_rows, np.float32)
+        return np.where(
+            positions < self._n_base,
+            self.confidence[np.minimum(positions, self._n_base - 1)],
+            delta[np.maximum(positions - self._n_base, 0)],
+        )
+
+    def dedup(self, positions: np.ndarray) -> np.ndarray:
+        """drop_duplicates(['image_external_url']) над массивом позиций (keep='first')."""
+        if len(positions) < 2:
+            return positions
+        _, first = np.unique(self._url_codes_at(positions), return_index=True)
+        return positions[np.sort(first)]
+
+    def posting_families(self) -> Dict[str, Dict]:
+        """Все постинги индекса (основы name/color/detailes, category, season, пол) — вход для шардов."""
+        return {**self._postings, **self._values, "gender": self._genders}
+
+    # --- дельты ---
+    @property
+    def segmented(self) -> bool:
+        """У версии есть примененные дельты (маска удаленных строк и/или сегмент изменений)."""
+        return self._dead is not None
+
+    @property
+    def delta_rows(self) -> int:
+        return self._delta.n_rows if self._delta is not None else 0
+
+    def patched(self, upserts: pd.DataFrame, removed: Optional[pd.DataFrame] = None) -> "CatalogIndex":
+        """
+        Новая версия индекса с примененной дельтой; текущая версия не меняется, так что
+        читатели дорабатывают на ней, пока вызывающий код атомарно не переключит ссылку.
+        `upserts` — добавленные/измененные строки (после prepare_catalog), `removed` — ключи
+        good_id/store_id удаленных. Базовый сегмент не копируется: замененные строки
+        помечаются в маске удаленных, а сегмент изменений (он мал) перестраивается целиком.
+        """
+        upserts = upserts.drop_duplicates(["good_id", "store_id"], keep="last")
+        touched = catalog_keys(upserts)
+        if removed is not None and len(removed):
+            touched = touched.append(catalog_keys(removed))
+
+        if self._keys is None:
+            self._keys = catalog_keys(self.df)
+        dead = self._dead.copy() if self._dead is not None else np.zeros(self._n_base, dtype=bool)
+        hit = self._keys.get_indexer_for(touched)
+        dead[hit[hit >= 0]] = True
+
+        frames = [upserts]
+        if self._delta is not None:
+            kept = self._delta.df[~catalog_keys(self._delta.df).isin(touched)]
+            frames.insert(0, kept)
+        delta_df = pd.concat(frames, ignore_index=True)
+        delta_df.index = pd.RangeIndex(self._next_label(), self._next_label() + len(delta_df))
+
+        version = copy.copy(self)                      # общие с базой постинги, цвета и кэш запросов
+        version.version = self.version + 1
+        version._dead = dead
+        version._delta = CatalogIndex(delta_df) if len(delta_df) else None
+        version._delta_url_codes = self._global_url_codes(delta_df) if len(delta_df) else _EMPTY
+        version.n_rows = int(self._n_base - dead.sum()) + len(delta_df)
+        return version
+
+    def compacted(self) -> "CatalogIndex":
+        """Полная пересборка: живые базовые строки + дельта в один сегмент (редкая операция)."""
+        frames = [self.df[~self._dead] if self._dead is not None else self.df]
+        if self._delta is not None:
+            frames.append(self._delta.df)
+        # база, собранная не из артефакта, может не иметь производных колонок дельты
+        frames = [f if set(DERIVED_COLUMNS) <= set(f.columns) else prepare_catalog(f) for f in frames]
+        index = CatalogIndex(pd.concat(frames, ignore_index=True))
+        index.version = self.version + 1
+        return index
+
+    # --- внутреннее ---
+    def _token_rows(self, field: str, query: Optional[str]) -> np.ndarray:
+        key = ("tokens", field, query)
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+
+        postings = self._postings[field]
+        result: Optional[np.ndarray] = None
+        for q in dict.fromkeys(stem_tokens(query)):
+            ids = postings.get(q, _EMPTY)
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+        if result is None:
+            result = _EMPTY
+        return self._remember(key, result)
+
+    def _color_rows(self, query: Optional[str]) -> np.ndarray:
+        key = ("color", query)
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+        ids = self._token_rows("color", query)
+        if self.colors is not None:
+            near = self.colors.query_word(query)
+            if near is not None:
+                ids = np.union1d(ids, near)
+        return self._remember(key, ids)
+
+    def _merge(self, ids: np.ndarray, delta_query: Callable[["CatalogIndex"], np.ndarray]) -> np.ndarray:
+        """Позиции базового сегмента без удаленных строк + позиции дельты со сдвигом."""
+        if self._dead is None:
+            return ids
+        if len(ids):
+            ids = ids[~self._dead[ids]]
+        if self._delta is not None:
+            extra = delta_query(self._delta)
+            if len(extra):
+                ids = np.concatenate([ids, extra + self._n_base])
+        return ids
+
+    def _url_codes_at(self, positions: np.ndarray) -> np.ndarray:
+        if self._delta is None:
+            return self.url_codes[positions]
+        return np.where(
+            positions < self._n_base,
+            self.url_codes[np.minimum(positions, self._n_base - 1)],
+            self._delta_url_codes[np.maximum(positions - self._n_base, 0)],
+        )
+
+    def _global_url_codes(self, delta_df: pd.DataFrame) -> np.ndarray:
+        """Коды URL дельты в пространстве кодов базы: тот же URL — тот же код, новые — после базовых."""
+        codes = pd.Index(self._url_uniques).get_indexer(delta_df["image_external_url"])
+        new = codes < 0
+        if new.any():
+            codes[new] = len(self._url_uniques) + pd.factorize(delta_df["image_external_url"][new])[0]
+        return codes
+
+    def _next_label(self) -> int:
+        """Метки строк дельты продолжают индекс базы, чтобы в take() не было повторов."""
+        index = self.df.index
+        return int(index.max()) + 1 if len(index) and pd.api.types.is_integer_dtype(index) else self._n_base
+
+    def _remember(self, key: tuple, value: np.ndarray) -> np.ndarray:
+        if len(self._cache) >= self.MAX_CACHED_QUERIES:
+            self._cache.clear()
+        self._cache[key] = value
+        return value
+
+
+def _frozen(ids: np.ndarray) -> np.ndarray:
+    ids.setflags(write=False)
+    return ids
+
+
+def _build_postings(token_lists: Iterable[Iterable[str]]) -> Dict[str, np.ndarray]:
+    postings: Dict[str, list] = defaultdict(list)
+    for pos, tokens in enumerate(token_lists):
+        for tok in set(tokens):
+            if tok:
+                postings[tok].append(pos)
+    return {tok: np.asarray(ids, dtype=np.int64) for tok, ids in postings.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сборка Parquet-артефакта каталога из CSV")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="CSV → дедуплицированный типизированный Parquet")
+    build.add_argument("csv_in")
+    build.add_argument("out_path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        built = build_catalog(args.csv_in, args.out_path)
+        print(f"✅ Saved → {args.out_path}  (rows: {len(built)})")
@@ -0,0 +1,130 @@
+# catalog_manager.py
+from __future__ import annotations
+import os
+import threading
+import warnings
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+
+from catalog import DATA_DIR, CatalogIndex, load_catalog, prepare_catalog, to_list
+from telemetry import span
+
+
+DEFAULT_DELTA_DIR = Path(os.getenv("CATALOG_DELTA_DIR", DATA_DIR / "catalog_deltas")).expanduser()
+DELTA_EXT = {".csv", ".parquet"}
+
+
+def read_delta(path: Path) -> pd.DataFrame:
+    """
+    Файл дельты: строки каталога в формате исходного CSV/Parquet плюс необязательная
+    колонка `op` — "upsert" (по умолчанию) или "delete" (достаточно good_id и store_id).
+    """
+    if path.suffix == ".csv":
+        df = pd.read_csv(path, converters={"category_id": to_list})
+    else:
+        df = pd.read_parquet(path)
+    missing = {"good_id", "store_id"} - set(df.columns)
+    if missing:
+        raise ValueError(f"Delta {path.name} has no key columns: {sorted(missing)}")
+    return df.fillna("")
+
+
+class CatalogManager:
+    """
+    Текущая версия каталога и инкрементальное обновление из файлов дельт.
+
+    Дельты (`*.csv` / `*.parquet` в `delta_dir`) применяются по порядку имен: добавленные и
+    измененные строки (ключ good_id + store_id) попадают в сегмент изменений индекса, удаленные
+    помечаются в маске — без перечитывания каталога и без второй полной копии в памяти.
+    Новая версия публикуется одной заменой ссылки; запрос берет `current()` один раз и до
+    конца работает с согласованной версией. Когда дельта дорастает до `compact_ratio`
+    от базы, индекс пересобирается в один сегмент.
+
+    Файлы дельт стоит класть атомарно (запись во временный файл + rename): недочитанный
+    файл пропускается и будет применен при следующем опросе.
+    """
+
+    def __init__(self, path: Path, delta_dir: Path = DEFAULT_DELTA_DIR, compact_ratio: float = 0.2):
+        self.path = Path(path)
+        self.delta_dir = Path(delta_dir)
+        self.compact_ratio = compact_ratio
+        self._index = CatalogIndex(load_catalog(self.path))
+        self._applied: Set[str] = set()
+        self._failed: Dict[str, float] = {}   # имя → mtime дельты, которую не удалось применить
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # при старте догоняем дельты, накопившиеся после сборки артефакта
+        self.poll()
+
+    def current(self) -> CatalogIndex:
+        return self._index
+
+    def apply(self, delta: pd.DataFrame) -> CatalogIndex:
+        """Применяет дельту (см. read_delta) и публикует новую версию индекса."""
+        ops = delta["op"].astype(str).str.strip().str.lower() if "op" in delta.columns else pd.Series("upsert", index=delta.index)
+        removed = delta.loc[ops == "delete", ["good_id", "store_id"]]
+        upserts = delta.loc[ops != "delete"].drop(columns=["op"], errors="ignore")
+        if "category_id" not in upserts.columns:
+            upserts = upserts.assign(category_id=[[] for _ in range(len(upserts))])
+
+        with self._lock:
+            with span("catalog_patch", rows=len(delta)) as s:
+                index = self._index.patched(prepare_catalog(upserts), removed)
+                if index.delta_rows > self.compact_ratio * max(index.n_rows, 1):
+                    index = index.compacted()
+                    s.set(compactions=1)
+            self._index = index              # атомарное переключение версии
+        return index
+
+    def poll(self) -> int:
+        """Применяет новые файлы дельт; возвращает их число."""
+        if not self.delta_dir.is_dir():
+            return 0
+        applied = 0
+        for path in self._pending():
+            try:
+                delta = read_delta(path)
+            except Exception as e:           # файл еще пишется или битый — попробуем в следующий раз
+                warnings.warn(f"Catalog delta {path.name} skipped: {e}")
+                continue
+            try:
+                self.apply(delta)
+            except Exception as e:           # дельта не ложится на каталог — ждем, пока файл заменят
+                warnings.warn(f"Catalog delta {path.name} failed to apply: {type(e).__name__}: {e}")
+                self._failed[path.name] = path.stat().st_mtime
+                continue
+            self._failed.pop(path.name, None)
+            self._applied.add(path.name)
+            applied += 1
+        return applied
+
+    def start(self, interval: float = 30.0) -> None:
+        """Фоновый опрос `delta_dir` раз в `interval` секунд."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, args=(interval,), name="catalog-deltas", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _pending(self) -> List[Path]:
+        return sorted(
+            p for p in self.delta_dir.iterdir()
+            if p.suffix in DELTA_EXT and p.is_file() and p.name not in self._applied
+            and self._failed.get(p.name) != p.stat().st_mtime
+        )
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.poll()
+            except Exception as e:           # поток опроса не должен умирать молча
+                warnings.warn(f"Catalog delta poll failed: {type(e).__name__}: {e}")
@@ -0,0 +1,153 @@
+# color_index.py
+from __future__ import annotations
+import ast
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# Прототипы базовых цветов в HSL (h 0..360, s/l 0..100) и радиус области в ΔE (CIE76).
+# Ключ — основа слова, чтобы «розовый/розовая/розовые» попадали в одну область.
+COLOR_WORDS: Dict[str, Tuple[List[Tuple[float, float, float]], float]] = {
+    "красн": ([(0, 80, 45), (350, 75, 40)], 28.0),
+    "бордов": ([(345, 70, 25)], 22.0),
+    "розов": ([(340, 80, 80), (330, 75, 60)], 25.0),
+    "оранж": ([(28, 90, 55)], 25.0),
+    "желт": ([(52, 90, 55), (48, 85, 70)], 25.0),
+    "зелен": ([(120, 55, 40), (90, 45, 45), (150, 50, 30)], 30.0),
+    "оливк": ([(70, 40, 35)], 20.0),
+    "голуб": ([(200, 70, 70), (195, 60, 80)], 22.0),
+    "син": ([(225, 70, 35), (215, 60, 25)], 28.0),
+    "фиолет": ([(275, 55, 40), (285, 45, 60)], 28.0),
+    "сирен": ([(270, 40, 70)], 20.0),
+    "коричн": ([(25, 50, 30), (20, 40, 22)], 22.0),
+    "бежев": ([(35, 40, 80), (30, 35, 70)], 16.0),
+    "сер": ([(0, 0, 50), (0, 0, 65), (0, 0, 35)], 12.0),
+    "черн": ([(0, 0, 8)], 15.0),
+    "бел": ([(0, 0, 97)], 10.0),
+    "молочн": ([(40, 40, 93)], 8.0),
+}
+# «светлый»/«темный» без конкретного цвета — запрос только по светлоте L*
+LIGHTNESS_WORDS: Dict[str, Tuple[float, float]] = {
+    "светл": (70.0, 101.0),
+    "темн": (-1.0, 35.0),
+}
+GRID_CELL = 10.0
+
+# sRGB (D65) → XYZ
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+
+
+def hsl_to_lab(hsl: np.ndarray) -> np.ndarray:
+    """HSL (h 0..360, s/l 0..100) → CIELAB, векторно; результат float32 (n × 3)."""
+    hsl = np.asarray(hsl, dtype=np.float64).reshape(-1, 3)
+    h, s, l = hsl[:, 0] % 360.0, hsl[:, 1] / 100.0, hsl[:, 2] / 100.0
+
+    # HSL → sRGB
+    c = (1.0 - np.abs(2.0 * l - 1.0)) * s
+    k = lambda n: (n + h / 30.0) % 12.0
+    a = c / 2.0
+    rgb = np.stack([l - a * np.clip(np.minimum(k(n) - 3.0, 9.0 - k(n)), -1.0, 1.0) for n in (0, 8, 4)], axis=1)
+
+    # sRGB → линейный RGB → XYZ → Lab
+    lin = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = lin @ _RGB_TO_XYZ.T / _WHITE_D65
+    eps, kappa = 216 / 24389, 24389 / 27
+    f = np.where(xyz > eps, np.cbrt(xyz), (kappa * xyz + 16.0) / 116.0)
+    lab = np.stack([116.0 * f[:, 1] - 16.0, 500.0 * (f[:, 0] - f[:, 1]), 200.0 * (f[:, 1] - f[:, 2])], axis=1)
+    return lab.astype(np.float32)
+
+
+def parse_hsl(val) -> List[List[float]]:
+    """color_hsl: строка "[[h, s, l], ...]" (CSV) или вложенный массив (Parquet) → список троек."""
+    if isinstance(val, str):
+        text = val.strip()
+        if not text.startswith("["):
+            return []
+        try:
+            val = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            return []
+    if val is None or not len(val):
+        return []
+    if isinstance(val[0], (int, float, np.integer, np.floating)):
+        val = [val]                       # одна тройка без внешнего списка
+    return [[float(x) for x in triple] for triple in val if len(triple) == 3]
+
+
+def first_hsl(val) -> Optional[List[float]]:
+    """Доминирующий (первый) цвет из color_hsl."""
+    triples = parse_hsl(val)
+    return triples[0] if triples else None
+
+
+class ColorIndex:
+    """
+    Индекс цветов каталога в перцептивном пространстве CIELAB.
+    Lab хранится компактным float32-массивом (n × 3), поиск по области —
+    через равномерную сетку, запрос по светлоте — через отсортированный L*.
+    """
+
+    def __init__(self, lab: np.ndarray, positions: np.ndarray):
+        self.lab = lab                    # float32 (m × 3) — только строки с известным цветом
+        self.positions = positions        # позиции этих строк в каталоге
+        self._by_l = np.argsort(lab[:, 0], kind="stable")
+        self._sorted_l = lab[self._by_l, 0]
+
+        cells: Dict[Tuple[int, int, int], list] = defaultdict(list)
+        for i, cell in enumerate(map(tuple, np.floor(lab / GRID_CELL).astype(np.int64))):
+            cells[cell].append(i)
+        self._grid = {cell: np.asarray(ids, dtype=np.int64) for cell, ids in cells.items()}
+
+    @classmethod
+    def from_values(cls, values: Iterable) -> "ColorIndex":
+        hsl, positions = [], []
+        for pos, val in enumerate(values):
+            triple = first_hsl(val)
+            if triple is not None:
+                hsl.append(triple)
+                positions.append(pos)
+        lab = hsl_to_lab(np.asarray(hsl)) if hsl else np.empty((0, 3), dtype=np.float32)
+        return cls(lab, np.asarray(positions, dtype=np.int64))
+
+    def within(self, center: np.ndarray, radius: float) -> np.ndarray:
+        """Позиции каталога в шаре ΔE ≤ radius вокруг center (Lab)."""
+        lo = np.floor((center - radius) / GRID_CELL).astype(np.int64)
+        hi = np.floor((center + radius) / GRID_CELL).astype(np.int64)
+        parts = [
+            ids for x in range(lo[0], hi[0] + 1) for y in range(lo[1], hi[1] + 1) for z in range(lo[2], hi[2] + 1)
+            if (ids := self._grid.get((x, y, z))) is not None
+        ]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        ids = np.concatenate(parts)
+        dist = np.linalg.norm(self.lab[ids] - center, axis=1)
+        return self.positions[ids[dist <= radius]]
+
+    def lightness_range(self, lo: float, hi: float) -> np.ndarray:
+        """Позиции каталога со светлотой L* в [lo, hi] — бинарный поиск по отсортированному L*."""
+        start, stop = np.searchsorted(self._sorted_l, [lo, hi], side="left")
+        return self.positions[self._by_l[start:stop]]
+
+    def query_word(self, word: Optional[str]) -> Optional[np.ndarray]:
+        """
+        Позиции каталога для цветового слова LLM (отсортированы).
+        None — слово не распознано, вызывающий код остается на строковом совпадении.
+        """
+        word = str(word or "").lower().replace("ё", "е").strip()
+        if not word:
+            return None
+        for stem, (lo, hi) in LIGHTNESS_WORDS.items():
+            if word.startswith(stem):
+                return np.sort(self.lightness_range(lo, hi))
+        for stem, (prototypes, radius) in COLOR_WORDS.items():
+            if word.startswith(stem):
+                centers = hsl_to_lab(np.asarray(prototypes))
+                return np.unique(np.concatenate([self.within(c, radius) for c in centers]))
+        return None
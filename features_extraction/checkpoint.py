@@ -0,0 +1,154 @@
+"""Append-only checkpoint of extraction results.
+
+Every finished row is written as one JSON line to a shard file in the checkpoint
+directory and flushed immediately, so a crash loses at most the call in flight.
+A restarted run asks :meth:`CheckpointStore.done` which keys already have a
+result and skips them. Each run writes to new shard files (rotated every
+``rows_per_shard`` rows); old shards are never rewritten.
+
+The final outputs are produced by streaming the shards in chunks
+(:meth:`CheckpointStore.iter_chunks`), so results never have to fit in memory
+as one list.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import pandas as pd
+
+
+def _json_default(value: Any) -> Any:
+    # numpy scalars from itertuples / pandas
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class CheckpointStore:
+    """JSONL shards of result records keyed by ``key`` (``good_id``); single writer."""
+
+    def __init__(self, directory: Path, key: str = "good_id", rows_per_shard: int = 10_000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.key = key
+        self.rows_per_shard = rows_per_shard
+        self._run = time.strftime("%Y%m%d-%H%M%S")
+        self._seq = 0
+        self._rows_in_shard = 0
+        self._file = None
+        self._done: Optional[Set[Any]] = None
+
+    # ---------- reading ----------
+    def shards(self) -> List[Path]:
+        return sorted(self.directory.glob("part-*.jsonl"))
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        for path in self.shards():
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # a line cut short by a crash — that row is simply redone
+                        continue
+
+    def done(self) -> Set[Any]:
+        """Keys that already have a checkpointed result."""
+        if self._done is None:
+            self._done = {record[self.key] for record in self.iter_records() if self.key in record}
+        return self._done
+
+    def columns(self) -> List[str]:
+        """Union of record fields over all shards, in first-seen order (key first)."""
+        seen: Dict[str, None] = {self.key: None}
+        for record in self.iter_records():
+            seen.update(dict.fromkeys(record))
+        return list(seen)
+
+    def iter_chunks(self, chunksize: int = 50_000) -> Iterator[pd.DataFrame]:
+        """Results as DataFrames of at most ``chunksize`` rows, columns aligned to :meth:`columns`."""
+        columns = self.columns()
+        chunk: List[Dict[str, Any]] = []
+        for record in self.iter_records():
+            chunk.append(record)
+            if len(chunk) >= chunksize:
+                yield pd.DataFrame.from_records(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame.from_records(chunk, columns=columns)
+
+    # ---------- writing ----------
+    def append(self, record: Dict[str, Any]) -> None:
+        if self._file is None or self._rows_in_shard >= self.rows_per_shard:
+            self._rotate()
+        self._file.write(json.dumps(record, ensure_ascii=False, default=_json_default) + "\n")
+        self._file.flush()
+        self._rows_in_shard += 1
+        if self._done is not None:
+            self._done.add(record[self.key])
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "CheckpointStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _rotate(self) -> None:
+        self.close()
+        self._seq += 1
+        self._rows_in_shard = 0
+        path = self.directory / f"part-{self._run}-{self._seq:05d}.jsonl"
+        self._file = path.open("a", encoding="utf-8")
+
+    # ---------- outputs ----------
+    def to_csv(self, path: Path, rename: Optional[Dict[str, str]] = None, chunksize: int = 50_000) -> int:
+        """All results as one CSV, written chunk by chunk; returns the row count."""
+        rows = 0
+        pd.DataFrame(columns=self.columns()).rename(columns=rename or {}).to_csv(path, index=False)
+        for chunk in self.iter_chunks(chunksize):
+            chunk.rename(columns=rename or {}).to_csv(path, mode="a", header=False, index=False)
+            rows += len(chunk)
+        return rows
+
+    def merge_into(
+        self,
+        df: pd.DataFrame,
+        path: Path,
+        rename: Optional[Dict[str, str]] = None,
+        chunksize: int = 50_000,
+    ) -> int:
+        """
+        Left join of ``df`` with the results on ``key``, streamed to CSV ``path``.
+        Rows with a result come first, in checkpoint order, followed by rows without one.
+        Returns the number of rows written.
+        """
+        rename = rename or {}
+        result_columns = [rename.get(c, c) for c in self.columns() if c != self.key]
+        # same column names as DataFrame.merge would produce for overlapping fields
+        overlap = set(result_columns) & (set(df.columns) - {self.key})
+        left = df.rename(columns={c: f"{c}_x" for c in overlap})
+        out_columns = list(left.columns) + [f"{c}_y" if c in overlap else c for c in result_columns]
+        pd.DataFrame(columns=out_columns).to_csv(path, index=False)
+
+        rows = 0
+        matched: Set[Any] = set()
+        for chunk in self.iter_chunks(chunksize):
+            chunk = chunk.drop_duplicates(self.key, keep="last").rename(columns=rename)
+            chunk = chunk[chunk[self.key].isin(df[self.key]) & ~chunk[self.key].isin(matched)]
+            chunk = chunk.rename(columns={c: f"{c}_y" for c in overlap})
+            part = left.merge(chunk, on=self.key, how="inner")
+            part.reindex(columns=out_columns).to_csv(path, mode="a", header=False, index=False)
+            matched.update(chunk[self.key])
+            rows += len(part)
+        rest = left[~left[self.key].isin(matched)]
+        rest.reindex(columns=out_columns).to_csv(path, mode="a", header=False, index=False)
+        return rows + len(rest)
@@ -0,0 +1,189 @@
+"""Concurrent, rate-limited execution of LLM extraction calls.
+
+* :class:`RateLimiter` – token buckets for requests/min and tokens/min shared by all workers.
+* :class:`EnrichmentEngine` – a bounded thread pool that runs one call per row, waits for the
+  limiter before each call and, on ``RateLimitError``, pauses *all* workers for the server's
+  ``retry-after`` before retrying.
+
+Limits default to the ``OPENAI_RPM`` / ``OPENAI_TPM`` env vars and concurrency to
+``ENRICH_CONCURRENCY``.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
+from openai import RateLimitError
+
+T = TypeVar("T")
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+class TokenBucket:
+    """Classic token bucket: ``per_minute`` capacity refilled continuously."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0          # tokens per second
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 — available now)."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)       # a single oversized call must still pass eventually
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Requests/min and tokens/min limits plus a shared pause after HTTP 429."""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(rpm=_env_float("OPENAI_RPM"), tpm=_env_float("OPENAI_TPM"))
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block until one request of ``tokens`` estimated tokens fits into both limits."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._paused_until - now
+                if delay <= 0:
+                    # both buckets must fit before either is charged, so waiting never leaks capacity
+                    charges = [(b, n) for b, n in ((self.requests, 1), (self.tokens, tokens)) if b is not None]
+                    delay = max([b.wait_time(n, now) for b, n in charges], default=0.0)
+                    if delay <= 0:
+                        for bucket, amount in charges:
+                            bucket.consume(amount)
+                        return
+            time.sleep(min(delay, 5.0))
+
+    def pause(self, seconds: float) -> None:
+        """Stop every worker for ``seconds`` (server asked to back off)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def retry_after_seconds(error: RateLimitError) -> Optional[float]:
+    """``retry-after-ms`` / ``retry-after`` header of a 429 response, if the server sent one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:                             # HTTP-date form — fall back to backoff
+        pass
+    return None
+
+
+# OpenAI charges a request against TPM by its prompt estimate plus ``max_completion_tokens``
+IMAGE_TOKENS = 765           # one 1024×1024 image at detail=high
+CHARS_PER_TOKEN = 3.0        # conservative for mixed Russian/English prompts
+
+
+def estimate_tokens(text: str = "", images: int = 0, max_completion_tokens: int = 0) -> int:
+    """Rough token cost of one call, as the server's rate limiter counts it."""
+    return int(len(text) / CHARS_PER_TOKEN) + images * IMAGE_TOKENS + max_completion_tokens
+
+
+class EnrichmentEngine:
+    """
+    Runs ``fn(item)`` for many items on ``concurrency`` threads under a shared
+    :class:`RateLimiter`. At most ``concurrency * 4`` items are in flight, so huge
+    inputs are streamed rather than submitted at once. Results are yielded as they
+    complete: ``(item, result)`` or ``(item, exception)`` — one failed row never stops the run.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        limiter: Optional[RateLimiter] = None,
+        max_rate_limit_retries: int = 8,
+        base_backoff: float = 2.0,
+    ):
+        self.concurrency = concurrency or int(os.getenv("ENRICH_CONCURRENCY", 8))
+        self.limiter = limiter or RateLimiter.from_env()
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.base_backoff = base_backoff
+        self.stats: Dict[str, int] = {"calls": 0, "cached": 0, "rate_limited": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
+
+    def map(
+        self,
+        fn: Callable[[T], dict],
+        items: Iterable[T],
+        cost: Callable[[T], int] = lambda _item: 0,
+        lookup: Optional[Callable[[T], Optional[dict]]] = None,
+    ) -> Iterator[Tuple[T, object]]:
+        """
+        ``cost(item)`` — estimated tokens of the call, charged to the tokens/min bucket.
+        ``lookup(item)`` — cached result or None; it runs on the worker before the limiter,
+        so cache hits are neither throttled nor counted against the limits.
+        """
+        it = iter(items)
+        window = self.concurrency * 4
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="enrich") as pool:
+            pending: Dict[Future, T] = {}
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < window:
+                    try:
+                        item = next(it)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[pool.submit(self._call, fn, item, cost(item), lookup)] = item
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        self._count("failed")
+                    yield item, (error if error is not None else future.result())
+
+    def _call(self, fn: Callable[[T], dict], item: T, tokens: int, lookup: Optional[Callable[[T], Optional[dict]]]) -> dict:
+        if lookup is not None:
+            hit = lookup(item)
+            if hit is not None:
+                self._count("cached")
+                return hit
+        for attempt in range(self.max_rate_limit_retries + 1):
+            self.limiter.acquire(tokens)
+            self._count("calls")
+            try:
+                return fn(item)
+            except RateLimitError as e:
+                if getattr(e, "code", None) == "insufficient_quota" or attempt == self.max_rate_limit_retries:
+                    raise
+                self._count("rate_limited")
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = self.base_backoff * (2 ** attempt) * (0.5 + random.random())
+                self.limiter.pause(delay)
+        raise AssertionError("unreachable")
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
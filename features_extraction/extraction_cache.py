@@ -0,0 +1,128 @@
+"""Persistent, content-addressed cache of extraction results.
+
+A result is stored under a key built from everything that determines it:
+
+* the *content* — SHA-256 of the image bytes (``infer_item_from_image``) or of the
+  normalized item name (``infer_item``), so the same photo listed under another
+  ``good_id``, store or URL is a hit;
+* the meta template — meta name and the JSON schema of its response model;
+* the model and the LLM backend, so stub results (``LLM_BACKEND=stub``) never
+  answer real runs;
+* a hash of the rendered system prompt.
+
+Changing any of them yields a new key, so stale results are never reused and
+nothing has to be invalidated by hand. Image URLs are mapped to their content
+digest in a second table, so unchanged URLs are not downloaded again on reruns.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Dict, Optional, Type
+
+from pydantic import BaseModel
+
+DEFAULT_EXTRACTION_CACHE_PATH = Path(
+    os.getenv("EXTRACTION_CACHE_PATH", Path(__file__).resolve().parent.parent / "data" / "extraction_cache.sqlite")
+).expanduser()
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Case and whitespace do not change the extraction input."""
+    return " ".join(str(text).lower().split())
+
+
+def _short_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def template_hash(meta: str, schema: Type[BaseModel]) -> str:
+    return _short_hash(meta + "\x1f" + json.dumps(schema.model_json_schema(), sort_keys=True))
+
+
+def extraction_key(
+    kind: str, digest: str, meta: str, schema: Type[BaseModel], model: str, prompt: str, backend: str
+) -> str:
+    """``kind`` — "image" or "text"; ``digest`` — content digest of the image or of the normalized name."""
+    raw = "\x1f".join([kind, digest, template_hash(meta, schema), model, _short_hash(prompt), backend])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """SQLite (WAL) store of result dicts by :func:`extraction_key`; safe to share between threads."""
+
+    def __init__(self, path: Path = DEFAULT_EXTRACTION_CACHE_PATH, url_ttl_seconds: float = 30 * 24 * 3600):
+        self.path = Path(path)
+        self.url_ttl_seconds = url_ttl_seconds
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stored": 0}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, payload TEXT NOT NULL, meta TEXT, model TEXT, created REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS url_digests ("
+            " url TEXT PRIMARY KEY, digest TEXT NOT NULL, checked REAL NOT NULL)"
+        )
+
+    # ---------- results ----------
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM results WHERE key = ?", (key,)).fetchone()
+            self._counters["hits" if row else "misses"] += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, result: Dict[str, Any], meta: str = "", model: str = "") -> None:
+        payload = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, payload, meta, model, created) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, meta, model, time.time()),
+            )
+            self._counters["stored"] += 1
+
+    # ---------- url → content digest ----------
+    def url_digest(self, url: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest FROM url_digests WHERE url = ? AND checked >= ?",
+                (url, time.time() - self.url_ttl_seconds),
+            ).fetchone()
+        return row[0] if row else None
+
+    def remember_url(self, url: str, digest: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO url_digests (url, digest, checked) VALUES (?, ?, ?)",
+                (url, digest, time.time()),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+def open_extraction_cache(path: Path = DEFAULT_EXTRACTION_CACHE_PATH) -> Optional[ExtractionCache]:
+    """Default cache; ``EXTRACTION_CACHE_DISABLED=1`` or an unwritable path disables caching."""
+    if os.getenv("EXTRACTION_CACHE_DISABLED") == "1":
+        return None
+    try:
+        return ExtractionCache(path)
+    except (sqlite3.Error, OSError) as e:
+        warnings.warn(f"Extraction cache disabled ({path}): {e}")
+        return None
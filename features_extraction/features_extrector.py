@@ -3,7 +3,8 @@
 • CSV input must contain: name, category_id, meta_category.
 • TEMPLATES comes from previous section (one entry per meta).
 • We process dataframe meta‑by‑meta to keep each prompt‑cache "hot" (TTL ≈ 5–10 min).
-• Cache IDs are persisted in cache_ids.json so repeated runs skip re‑warming.
+• Results are cached by image content / item name, meta template, model and prompt
+  (extraction_cache.sqlite), so reruns only pay for new or changed items.
 
 This module exposes two enrichment functions:
 * :func:`enrich_csv` – uses textual descriptions (``name`` column).
@@ -17,21 +18,31 @@ import json, os, time, requests
 from dotenv import load_dotenv
 load_dotenv()
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional
 import math
 import pandas as pd
 from tqdm import tqdm
 from langfuse.openai import openai
-from openai import OpenAI, APIConnectionError, BadRequestError, RateLimitError, APIError, BadRequestError
+from openai import OpenAI, APIConnectionError, BadRequestError, RateLimitError, APIError, BadRequestError, InternalServerError
 import httpx, time, uuid
-import base64, tempfile
+import base64, tempfile, io
+from PIL import Image
+import sys
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))   # llm_backend лежит в корне репозитория
+from llm_backend import OpenAIBackend, backend_from_env
+from checkpoint import CheckpointStore
+from enrichment_engine import EnrichmentEngine, estimate_tokens
+from image_dedup import cluster_images, hash_images
+from image_prep import ImagePreprocessor, PrepReport, vision_tokens
+from url_probe import ProbeResult, UrlProber
+from extraction_cache import content_digest, extraction_key, normalize_text, open_extraction_cache
 
 
 # ---------- 0. settings ----------
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-assert OPENAI_API_KEY, "Set OPENAI_API_KEY env var"
+assert OPENAI_API_KEY or os.getenv("LLM_BACKEND") == "stub", "Set OPENAI_API_KEY env var (or LLM_BACKEND=stub)"
 
 from prompts import GENERAL_PROMPT, TEMPLATES, MetaCategory, META_CATEGORY_DETECTION_PROMPT  # schemas & placeholders filled
 
@@ -54,23 +65,48 @@ langfuse = Langfuse(
   host=os.getenv("LANGFUSE_HOST"),
 )
 
-CACHE_FILE = Path("cache_ids.json")
-CACHE_FILE.touch(exist_ok=True)
-cache_ids: Dict[str, str] = json.loads(CACHE_FILE.read_text() or "{}")
+# EXTRACTION_CACHE_PATH / EXTRACTION_CACHE_DISABLED=1
+extraction_cache = open_extraction_cache()
+# доступность картинок: пул соединений + SQLite-кэш с TTL (URL_PROBE_CACHE_PATH)
+prober = UrlProber(concurrency=int(os.getenv("URL_PROBE_CONCURRENCY", 32)), per_host=int(os.getenv("URL_PROBE_PER_HOST", 8)))
 
 SESSION_ID = str(uuid.uuid4())
 
 # ---------- 1. helpers ---------
 DATA_DIR = Path(__file__).parent.parent / "data"
+CHECKPOINT_DIR = DATA_DIR / "checkpoints"
+
+
+def default_checkpoint_dir(csv_in: str, model: str, stage: str) -> Path:
+    """Отдельный чекпойнт на входной файл, модель и этап — перезапуск продолжает с места падения."""
+    return CHECKPOINT_DIR / f"{Path(csv_in).stem}.{model}.{stage}"
 
 client = OpenAI( api_key=OPENAI_API_KEY,
-     # можно и тут, но ниже покажу per-call override
-    # max_retries=2 по умолчанию
+    # без ретраев SDK: 429 повторяет только EnrichmentEngine (общая пауза по retry-after и бакеты
+    # RPM/TPM), сетевые ошибки и 5xx — _with_retry
+    max_retries=0,
     timeout=90.0,  # разумный верх для vision-задач
-)
+) if OPENAI_API_KEY else None   # без ключа (LLM_BACKEND=stub) клиент не нужен
+# LLM_BACKEND=stub — детерминированная заглушка без сети (нагрузочные прогоны)
+backend = backend_from_env(lambda: OpenAIBackend(lambda: client))
+
+MAX_COMPLETION_TOKENS = 15000   # reasoning-модели тратят часть бюджета на рассуждения
+
+
+def render_prompt(meta: str) -> str:
+    """GENERAL_PROMPT с подставленными примерами мета-категории."""
+    tpl = TEMPLATES[meta]
+    return GENERAL_PROMPT.replace('**META_CATEGORY_NAME**', tpl['metacategory_name']).replace('**CATEGORY_EXAMPLES**', tpl['fewshots_categories']).replace('**MODEL_EXAMPLES**', tpl['fewshots_silhouette'])
+
 
 def infer_item(name: str, response_format: Any,  model: str, max_completion_tokens: int, prompt: str = GENERAL_PROMPT, ) -> dict[str, Any]: #cache_id: str,
-    resp = client.beta.chat.completions.parse(
+    key = None
+    if extraction_cache is not None:
+        key = extraction_key("text", content_digest(normalize_text(name).encode("utf-8")), response_format.__name__, response_format, model, prompt, backend.name)
+        hit = extraction_cache.get(key)
+        if hit is not None:
+            return hit
+    resp = _with_retry(lambda: backend.parse(
         model=model, #tpl["model"],
         #cache_control={"prefix_cache_ids": [cache_id]},
         #prompt_cache_key=f"{hash(GENERAL_PROMPT)}",
@@ -81,20 +117,25 @@ def infer_item(name: str, response_format: Any,  model: str, max_completion_toke
         response_format=response_format,
         temperature=0.0,
         max_completion_tokens=max_completion_tokens,
-    )
-    return resp.choices[0].message.parsed.model_dump()
+    ))
+    result = resp.parsed.model_dump()
+    if key is not None:
+        extraction_cache.put(key, result, meta=response_format.__name__, model=model)
+    return result
 
 def _with_retry(call, tries=6, base_delay=0.5):
+    """Повторы при сетевых ошибках и 5xx; RateLimitError пробрасывается в EnrichmentEngine."""
     for attempt in range(1, tries + 1):
         try:
             return call()
-        except (APIConnectionError, httpx.RemoteProtocolError, httpx.ConnectError):
+        except (APIConnectionError, InternalServerError, httpx.RemoteProtocolError, httpx.ConnectError):
             if attempt == tries:
                 raise
             time.sleep(base_delay * (2 ** (attempt - 1)))
 
 
-def fetch_as_data_url(img_url: str, timeout=15) -> str:
+def fetch_image(img_url: str, timeout=15) -> tuple[bytes, str]:
+    """Байты картинки и ее content-type."""
     headers = {
         "User-Agent": "Mozilla/5.0",           # некоторые CDN режут «ботов»
         "Referer": img_url.rsplit("/", 1)[0],  # помогает против hotlink-защиты
@@ -102,29 +143,94 @@ def fetch_as_data_url(img_url: str, timeout=15) -> str:
     }
     r = requests.get(img_url, timeout=timeout, headers=headers)
     r.raise_for_status()
-    mime = r.headers.get("content-type", "image/jpeg")
-    b64 = base64.b64encode(r.content).decode("ascii")
+    return r.content, r.headers.get("content-type", "image/jpeg")
+
+
+def fetch_as_data_url(img_url: str, timeout=15) -> str:
+    data, mime = fetch_image(img_url, timeout=timeout)
+    b64 = base64.b64encode(data).decode("ascii")
     return f"data:{mime};base64,{b64}"
 
 
+# картинка качается один раз, обрезается, уменьшается и уходит в модель локальным WebP/JPEG
+# (IMAGE_PREP_MAX_SIDE, IMAGE_PREP_FORMAT, IMAGE_DETAIL, ...); IMAGE_PREP_DISABLED=1 — модель сама качает оригинал
+preprocessor = None if os.getenv("IMAGE_PREP_DISABLED") == "1" else ImagePreprocessor.from_env(fetch_image)
+prep_report = PrepReport()
+
+
+def image_digest(img_url: str) -> Optional[str]:
+    """SHA-256 содержимого картинки; URL → digest запоминается в кэше, повторно не качаем."""
+    digest = extraction_cache.url_digest(img_url)
+    if digest is None:
+        try:
+            if preprocessor is not None:
+                # URL новый или запись устарела: качаем заново (картинку могли заменить), заодно готовим ее для модели
+                digest = preprocessor.prepare(img_url, refresh=True).digest
+            else:
+                digest = content_digest(fetch_image(img_url)[0])
+        except (requests.RequestException, OSError):              # сеть или не картинка
+            return None
+        extraction_cache.remember_url(img_url, digest)
+    return digest
+
+
+def image_item_key(img_url: str, meta: str, model: str) -> Optional[str]:
+    """
+    Ключ результата по картинке. Описание товара в ключ намеренно не входит:
+    та же фотография у другого магазина/good_id должна попадать в кэш.
+    """
+    if extraction_cache is None:
+        return None
+    digest = image_digest(img_url)
+    if digest is None:
+        return None
+    kind = f"image/{preprocessor.signature}" if preprocessor is not None else "image"
+    return extraction_key(kind, digest, meta, TEMPLATES[meta]["class"], model, render_prompt(meta), backend.name)
+
+
+def cached_image_item(img_url: str, meta: str, model: str) -> tuple[Optional[dict[str, Any]], Optional[str]]:
+    """(результат из кэша или None, ключ); ключ после промаха передается в infer_item_from_image."""
+    key = image_item_key(img_url, meta, model)
+    return (extraction_cache.get(key) if key is not None else None), key
+
+
+_UNCHECKED = object()   # кэш еще не проверяли
+
+
 @observe()    
-def infer_item_from_image(img_url: str, description: str, meta: str, model: str) -> dict[str, Any]:
+def infer_item_from_image(img_url: str, description: str, meta: str, model: str, checked_key: Any = _UNCHECKED) -> dict[str, Any]:
+    """`checked_key` — ключ кэша, который вызывающий код уже проверил (промах, см. cached_image_item)."""
     tpl = TEMPLATES[meta]
+    if checked_key is _UNCHECKED:
+        hit, key = cached_image_item(img_url, meta, model)
+        if hit is not None:
+            return hit
+    else:
+        key = checked_key
+    image_url = {"url": img_url}
+    if preprocessor is not None:
+        try:
+            prepared = preprocessor.prepare(img_url)
+        except (requests.RequestException, OSError):
+            pass                                   # не скачали сами — пусть модель попробует оригинал
+        else:
+            image_url = {"url": prepared.data_url(), "detail": preprocessor.detail}
+            prep_report.add(meta, prepared, preprocessor.detail, model)
     content = [
         {"type": "text", "text": f"Item description: {description}"},
-        {"type": "image_url", "image_url": {"url": img_url}},  # Chat Completions синтаксис
+        {"type": "image_url", "image_url": image_url},  # Chat Completions синтаксис
     ]
-    prompt = GENERAL_PROMPT.replace('**META_CATEGORY_NAME**', tpl['metacategory_name']).replace('**CATEGORY_EXAMPLES**', tpl['fewshots_categories']).replace('**MODEL_EXAMPLES**', tpl['fewshots_silhouette'])
+    prompt = render_prompt(meta)
     # Get the client
     langfuse = get_client()
  
     # Add to the current trace
     langfuse.update_current_trace(session_id=SESSION_ID,  tags=["feature_extraction", meta])
     try:
-        do = lambda: client.with_options(
-            max_retries=5,            # поддерживается
+        do = lambda: backend.with_options(
+            max_retries=0,            # 429 повторяет EnrichmentEngine, сеть и 5xx — _with_retry
             timeout=120.0,            # поддерживается
-        ).beta.chat.completions.parse(
+        ).parse(
             model=model,
             messages=[
                 {"role": "system", "content": prompt},
@@ -132,7 +238,7 @@ def infer_item_from_image(img_url: str, description: str, meta: str, model: str)
             ],
             response_format=tpl["class"],  # Pydantic-модель
             # temperature НЕ передавать для reasoning-моделей вроде gpt-5
-            max_completion_tokens=15000,
+            max_completion_tokens=MAX_COMPLETION_TOKENS,
 
             # <-- если нужно добавить нестандартный заголовок (например, для прокси),
             # делай это здесь, а не в with_options:
@@ -140,7 +246,7 @@ def infer_item_from_image(img_url: str, description: str, meta: str, model: str)
             # есть также extra_query / extra_body
         )
         resp = _with_retry(do)
-        return resp.choices[0].message.parsed.model_dump()
+        result = resp.parsed.model_dump()
     except BadRequestError as e:
         # 2) Если ошибка вида invalid_image_url / timeout — фолбэк на data URL + Responses API
         msg = str(getattr(e, "message", e))
@@ -157,67 +263,150 @@ def infer_item_from_image(img_url: str, description: str, meta: str, model: str)
                 }],
                 text_format=tpl["class"],
             )
-            return resp2.output_parsed.model_dump()
-        # 3) Иначе пробрасываем
-        raise
+            result = resp2.output_parsed.model_dump()
+        else:
+            # 3) Иначе пробрасываем
+            raise
+    if key is not None:
+        extraction_cache.put(key, result, meta=meta, model=model)
+    return result
 
 
-def is_image_accessible(url: str, timeout: float = 5.0) -> bool:
-    """Return True if the image URL responds with HTTP 200."""
-    try:
-        resp = requests.head(url, timeout=timeout, allow_redirects=True)
-        if resp.status_code == 200:
-            return True
-        # Some servers may not support HEAD; fall back to GET
-        resp = requests.get(url, timeout=timeout, stream=True)
-        status = resp.status_code
-        resp.close()
-        return status == 200
-    except Exception:
-        return False
+def is_image_accessible(url: str) -> bool:
+    """Return True if the image URL responds with HTTP 200 (cached, see UrlProber)."""
+    return bool(url) and prober.probe(url).ok
+
+
+def probe_images(urls: Iterable[str]) -> Dict[str, ProbeResult]:
+    """Bulk reachability check: pooled, per-host limited, cached between runs."""
+    urls = list(dict.fromkeys(u for u in urls if u))
+    results = {r.url: r for r in tqdm(prober.probe_iter(urls), total=len(urls), desc="probe", leave=False)}
+    unreachable = sum(not r.ok for r in results.values())
+    if unreachable:
+        print(f"[warn] {unreachable} of {len(results)} images unreachable, skipping them")
+    return results
+
+
+def load_image(img_url: str) -> Image.Image:
+    """Подготовленная картинка из локального хранилища (или оригинал, если подготовка выключена)."""
+    if preprocessor is not None:
+        return Image.open(preprocessor.prepare(img_url).path)
+    return Image.open(io.BytesIO(fetch_image(img_url)[0]))
+
+
+# IMAGE_DEDUP_DISTANCE — порог расстояния Хэмминга 64-битных pHash/dHash; IMAGE_DEDUP_DISABLED=1 — без склейки
+IMAGE_DEDUP_DISTANCE = int(os.getenv("IMAGE_DEDUP_DISTANCE", 6))
+
+
+def group_near_duplicates(rows: list, workers: int = 8) -> Dict[str, list]:
+    """URL представителя → строки с той же фотографией (перезалитой другим магазином/CDN)."""
+    by_url = {row.image_external_url: row for row in rows}
+    if os.getenv("IMAGE_DEDUP_DISABLED") == "1":
+        return {url: [row] for url, row in by_url.items()}
+    hashes = hash_images(by_url, load_image, workers=workers)
+    representative = cluster_images(hashes, max_distance=IMAGE_DEDUP_DISTANCE)
+    groups: Dict[str, list] = {}
+    for url, row in by_url.items():
+        groups.setdefault(representative.get(url, url), []).append(row)
+    if len(groups) < len(by_url):
+        print(f"   dedup: {len(by_url)} images → {len(groups)} distinct photos")
+    return groups
 
 
 # ---------- 3. image‑based enrichment ----------
-def enrich_csv_from_images(csv_in: str, model: str, csv_out: str) -> None:
-    """Enrich dataset using images referenced by 'image_external_url'."""
+def enrich_csv_from_images(
+    csv_in: str,
+    model: str,
+    csv_out: str,
+    metas: Optional[Iterable[str]] = None,
+    engine: Optional[EnrichmentEngine] = None,
+    checkpoint_dir: Optional[Path] = None,
+) -> None:
+    """Enrich dataset using images referenced by 'image_external_url'.
+
+    Rows are processed meta‑by‑meta (prompt cache stays hot), rows of one meta run
+    concurrently on ``engine`` (ENRICH_CONCURRENCY / OPENAI_RPM / OPENAI_TPM by default).
+    ``metas`` limits the run to the given meta categories (all by default).
+    Near-duplicate photos (perceptual hash) are extracted once and the result is
+    copied to every row of the cluster.
+    Every result is appended to ``checkpoint_dir`` as it arrives; a rerun skips
+    good_ids that are already there.
+    """
     df = pd.read_csv(csv_in)
     df = df.fillna("")
     df = df.drop_duplicates(["image_external_url"]).drop_duplicates(["good_id", "store_id"])
     assert {"image_external_url", "meta_category"}.issubset(
         df.columns
     ), "CSV must have 'image_external_url' and 'meta_category' columns"
-
-    records: list[dict[str, Any]] = []
+    engine = engine or EnrichmentEngine()
+    metas = set(metas) if metas is not None else None
+    store = CheckpointStore(checkpoint_dir or default_checkpoint_dir(csv_in, model, "images"))
+    done = store.done()
+    if done:
+        print(f"↻ Resuming: {len(done)} items already extracted in {store.directory}")
 
     for meta, group in df.groupby("meta_category", sort=False):
         if meta not in TEMPLATES:
             print(f"[warn] Unknown meta '{meta}', skipping {len(group)} rows")
             continue
-        if meta != 'fullbody':
-            pass
+        if metas is not None and meta not in metas:
+            continue
+        print(f"➡ Processing {len(group)} items of meta '{meta}' …")
+        cost = estimate_tokens(render_prompt(meta), max_completion_tokens=MAX_COMPLETION_TOKENS)
+        if preprocessor is not None:
+            side = preprocessor.max_side
+            cost += vision_tokens(side, side, detail=preprocessor.detail, model=model)
         else:
-            print(f"➡ Processing {len(group)} items of meta '{meta}' …")
-            for row in tqdm(group.itertuples(index=False), total=len(group), leave=False):
-                if not row.image_external_url:
-                    continue
-                if not is_image_accessible(row.image_external_url):
-                    print(f"[warn] Unreachable image {row.image_external_url}, skipping")
-                    continue
-                time.sleep(0.1)
-                item = infer_item_from_image(img_url=row.image_external_url, description=str(row.name), meta=meta, model=model)
-                item["good_id"] = row.good_id
-                records.append(item)
+            cost += estimate_tokens(images=1)
 
-    df_rec = pd.DataFrame(records)
-    df_rec.to_csv(DATA_DIR / "extracted_products_from_images_fullbody.csv", index=False)
-    df_enriched = df.merge(df_rec, on="good_id", how="left")
-    df_enriched.to_csv(csv_out, index=False)
-    print(f"✅ Saved → {csv_out}  (rows: {len(df_rec)})")
+        checked: Dict[str, Optional[str]] = {}   # URL → ключ кэша после промаха в lookup
+
+        def lookup(row, meta=meta):
+            hit, checked[row.image_external_url] = cached_image_item(row.image_external_url, meta, model)
+            return hit
+
+        def extract(row, meta=meta):
+            return infer_item_from_image(
+                img_url=row.image_external_url, description=str(row.name), meta=meta, model=model,
+                checked_key=checked.pop(row.image_external_url, _UNCHECKED),
+            )
+
+        rows = [row for row in group.itertuples(index=False) if row.image_external_url and row.good_id not in done]
+        probes = probe_images(row.image_external_url for row in rows)
+        rows = [row for row in rows if probes[row.image_external_url].ok]
+        groups = group_near_duplicates(rows, workers=engine.concurrency)
+        representatives = [members[0] for members in groups.values()]
+        with store:
+            for row, item in tqdm(
+                engine.map(extract, representatives, cost=lambda _row: cost, lookup=lookup if extraction_cache is not None else None),
+                total=len(representatives), leave=False,
+            ):
+                if isinstance(item, Exception):
+                    print(f"[warn] Extraction failed for good_id={row.good_id}: {item!r}")
+                    continue
+                for member in groups[row.image_external_url]:
+                    store.append({**item, "good_id": member.good_id})
+        report = prep_report.summary(meta)
+        if report:
+            print(f"   image prep [{meta}]: {report}")
+
+    print(f"   LLM calls: {engine.stats}, cache: {extraction_cache.stats() if extraction_cache is not None else 'off'}")
+    suffix = "_".join(sorted(metas)) if metas else "all"
+    n_rec = store.to_csv(DATA_DIR / f"extracted_products_from_images_{suffix}.csv")
+    store.merge_into(df, csv_out)
+    print(f"✅ Saved → {csv_out}  (rows: {n_rec})")
 
 # ---------- 2. main text‑based enrichment ----------
 # only metacategory extraction from text
-def get_category(csv_in: str, csv_out: str, model: str = 'gpt-4.1-mini') -> None:
-    """Classify items to metacategories by names (text)."""
+def get_category(
+    csv_in: str,
+    csv_out: str,
+    model: str = 'gpt-4.1-mini',
+    engine: Optional[EnrichmentEngine] = None,
+    checkpoint_dir: Optional[Path] = None,
+) -> None:
+    """Classify items to metacategories by names (text); rows run concurrently on ``engine``
+    and are checkpointed to ``checkpoint_dir``, so a rerun only classifies the rest."""
     df = pd.read_csv(csv_in)
     df = df.fillna("")
     df = df.drop_duplicates(['image_external_url']).drop_duplicates(['good_id', 'store_id'])
@@ -225,37 +414,48 @@ def get_category(csv_in: str, csv_out: str, model: str = 'gpt-4.1-mini') -> None
         "name",
     }.issubset(df.columns), "CSV must have 'name' columns"
 
-    records: list[dict[str, Any]] = []
+    engine = engine or EnrichmentEngine()
+    store = CheckpointStore(checkpoint_dir or default_checkpoint_dir(csv_in, model, "categories"))
+    done = store.done()
+
+    def classify(row) -> dict[str, Any]:
+        access = row.image_external_url in probes and probes[row.image_external_url].ok
+        if access:
+            item = infer_item(name=str(row.name), model=model, prompt=META_CATEGORY_DETECTION_PROMPT, response_format=MetaCategory, max_completion_tokens=100)
+        else:
+            item = dict()
+        item['img_accessible'] = access
+        return item
 
     print(f"➡ Classify {csv_in} items to meta-categories")
-    for row in tqdm(df.itertuples(index=False), total=len(df), leave=False):
+    rows = []
+    for row in df.itertuples(index=False):
         if isinstance(row.name, float) and math.isnan(row.name):
             # Skip items with no name
-            item = {"good_id": row.good_id, "category": None, "img_accessible": None}
-        else:
-            name = str(row.name)         # guarantees plain text for the API
-
-            #time.sleep(0.1)  # gentle rate‑limit
-            access = is_image_accessible(row.image_external_url)
-            if access:
-                item = infer_item(name=name, model=model, prompt=META_CATEGORY_DETECTION_PROMPT, response_format=MetaCategory, max_completion_tokens=100) #cache_id)
-            else:
-                item = dict()
+            continue
+        if row.good_id not in done:
+            rows.append(row)
+    if done:
+        print(f"↻ Resuming: {len(done)} items already classified in {store.directory}")
+    probes = probe_images(row.image_external_url for row in rows)
+    with store:
+        for row, item in tqdm(
+            engine.map(classify, rows, cost=lambda row: estimate_tokens(META_CATEGORY_DETECTION_PROMPT + str(row.name), max_completion_tokens=100)),
+            total=len(rows), leave=False,
+        ):
+            if isinstance(item, Exception):
+                print(f"[warn] Classification failed for good_id={row.good_id}: {item!r}")
+                continue
             item["good_id"] = row.good_id
-            item['img_accessible'] = access
-            records.append(item)
-
-    # concat and save
-    df_rec = pd.DataFrame(records) # now join / concat will align exactly to the indexes
-    df_rec.rename(columns={'category': 'meta_category_ai'}, inplace=True)
+            store.append(item)
 
-    df_rec.to_csv(DATA_DIR / f"extracted_products_categories.csv") 
-    print(f"✅ Saved → {DATA_DIR / f"extracted_products_categories.csv"}  (rows: {len(df_rec)})")
- 
-    df_enriched = df.merge(df_rec, on="good_id", how="left")
-    df_enriched.to_csv(csv_out, index=False)
-    print(f"✅ Saved → {csv_out}  (rows: {len(df_enriched)})")
+    # stream the checkpoint into the outputs
+    rename = {'category': 'meta_category_ai'}
+    n_rec = store.to_csv(DATA_DIR / "extracted_products_categories.csv", rename=rename)
+    print(f"✅ Saved → {DATA_DIR / 'extracted_products_categories.csv'}  (rows: {n_rec})")
 
+    n_rows = store.merge_into(df, csv_out, rename=rename)
+    print(f"✅ Saved → {csv_out}  (rows: {n_rows})")
 
 if __name__ == "__main__":
     in_path = DATA_DIR / 'items_with_ai_category_small_manual_check.csv' #"items_with_meta_small.csv"
@@ -264,5 +464,5 @@ if __name__ == "__main__":
 
     # Example usage (uncomment the desired call):
     # enrich_csv(in_path, "gpt-4.1", out_path_text)
-    enrich_csv_from_images(in_path, "gpt-5-mini", out_path_img)
+    enrich_csv_from_images(in_path, "gpt-5-mini", out_path_img, metas=["fullbody"])
     #get_category(csv_in=DATA_DIR / "items_with_meta_small.csv", csv_out=DATA_DIR / "items_with_category.csv", model = 'gpt-4.1-mini') 
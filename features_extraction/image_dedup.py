@@ -0,0 +1,159 @@
+"""Near-duplicate detection for catalog images.
+
+The same product photo often comes from several stores or CDN paths, each
+re-encoded, resized or lightly cropped. Byte-level digests do not match, but
+perceptual hashes do. Each image gets:
+
+* a 64-bit pHash (low frequencies of a 32×32 DCT),
+* a 64-bit dHash (horizontal gradients of a 9×8 thumbnail),
+* its mean RGB colour. Both hashes work on grayscale and would treat the same
+  garment in two colours as one photo; the colour check stops that.
+
+:func:`cluster_images` indexes the pHashes in a BK-tree and, for each image,
+looks up every hash within ``max_distance`` bits. A candidate pair is accepted
+when the dHash distance and the colour distance also agree. Accepted pairs are
+joined with union-find, so near-duplicates of near-duplicates end up in one
+cluster.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+_N = 32
+_DCT = np.cos(np.pi * (2 * np.arange(_N)[None, :] + 1) * np.arange(_N)[:, None] / (2 * _N))
+
+
+@dataclass(frozen=True)
+class ImageHash:
+    phash: int
+    dhash: int
+    color: Tuple[float, float, float]
+
+
+def _bits(mask: np.ndarray) -> int:
+    return int("".join("1" if b else "0" for b in mask.ravel()), 2)
+
+
+def phash(img: Image.Image) -> int:
+    pixels = np.asarray(img.convert("L").resize((_N, _N), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8]
+    return _bits(low > np.median(low.ravel()[1:]))          # DC term would dominate the median
+
+
+def dhash(img: Image.Image) -> int:
+    pixels = np.asarray(img.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def image_hash(img: Image.Image) -> ImageHash:
+    rgb = img.convert("RGB")
+    color = np.asarray(rgb.resize((16, 16)), dtype=np.float64).reshape(-1, 3).mean(axis=0)
+    return ImageHash(phash(rgb), dhash(rgb), tuple(float(c) for c in color))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Metric tree over 64-bit hashes under Hamming distance; ``search`` prunes by the triangle inequality."""
+
+    def __init__(self):
+        self._root: Optional[list] = None             # node = [hash, [ids], {distance: child}]
+
+    def add(self, value: int, item: int) -> None:
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[int]:
+        found: List[int] = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= radius:
+                found.extend(node[1])
+            for dist, child in node[2].items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        return found
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)    # the earliest item stays the representative
+
+
+def hash_images(
+    keys: Iterable[Hashable],
+    load: Callable[[Hashable], Image.Image],
+    workers: int = 8,
+) -> Dict[Hashable, ImageHash]:
+    """Hashes of the images ``load(key)`` returns; keys whose image cannot be loaded are left out."""
+    def one(key):
+        try:
+            with load(key) as img:
+                return key, image_hash(img)
+        except Exception:                             # network, missing file, not an image
+            return key, None
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="img-hash") as pool:
+        return {key: h for key, h in pool.map(one, list(keys)) if h is not None}
+
+
+def cluster_images(
+    hashes: Dict[Hashable, ImageHash],
+    max_distance: int = 6,
+    color_tolerance: float = 24.0,
+) -> Dict[Hashable, Hashable]:
+    """
+    Map every key to the representative of its near-duplicate cluster (the first
+    key of the cluster in ``hashes`` order). Singletons map to themselves.
+    """
+    keys = list(hashes)
+    values = [hashes[k] for k in keys]
+    tree = BKTree()
+    for i, h in enumerate(values):
+        tree.add(h.phash, i)
+
+    uf = _UnionFind(len(keys))
+    for i, h in enumerate(values):
+        for j in tree.search(h.phash, max_distance):
+            if j <= i:
+                continue
+            other = values[j]
+            if (
+                hamming(h.dhash, other.dhash) <= max_distance
+                and np.linalg.norm(np.subtract(h.color, other.color)) <= color_tolerance
+            ):
+                uf.union(i, j)
+    return {key: keys[uf.find(i)] for i, key in enumerate(keys)}
@@ -0,0 +1,241 @@
+"""Image pre-processing before vision extraction.
+
+:class:`ImagePreprocessor` downloads each image once, trims the uniform
+background border, downscales it to ``max_side`` and re-encodes it as compact
+JPEG/WebP into a local content-addressed store. The model then receives that
+file as a data URL with the configured ``detail`` level, instead of fetching
+the full-size original. An SQLite index maps each URL to its original digest
+and dimensions, so reruns neither download nor re-encode; entries older than
+``ttl_seconds`` are fetched again, so an image replaced at the same URL is picked up.
+
+:class:`PrepReport` collects bytes and estimated vision tokens, original vs
+prepared, per meta category.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+DEFAULT_PREP_DIR = Path(
+    os.getenv("IMAGE_PREP_DIR", Path(__file__).resolve().parent.parent / "data" / "image_prep")
+).expanduser()
+
+FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+DETAILS = ("low", "high", "auto")
+
+# models that bill images in 32px patches rather than 512px tiles, with the per-model
+# multiplier applied to the patch count (most specific prefix first)
+PATCH_MODELS = {
+    "gpt-4.1-mini": 1.62,
+    "gpt-4.1-nano": 2.46,
+    "gpt-5-mini": 1.62,
+    "gpt-5-nano": 2.46,
+    "o4-mini": 1.72,
+    "gpt-5": 1.0,
+}
+
+
+def vision_tokens(width: int, height: int, detail: str = "high", model: str = "") -> int:
+    """Estimated input tokens of one image, following OpenAI's published sizing rules."""
+    multiplier = next((m for prefix, m in PATCH_MODELS.items() if model.startswith(prefix)), None)
+    if multiplier is not None:
+        if width * height > 1536 * 32 * 32:                 # scaled down to fit 1536 patches
+            scale = math.sqrt(1536 * 32 * 32 / (width * height))
+            width, height = int(width * scale), int(height * scale)
+        return math.ceil(min(1536, math.ceil(width / 32) * math.ceil(height / 32)) * multiplier)
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))              # fit into 2048×2048
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))                # shortest side 768
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    digest: str                     # SHA-256 of the original bytes
+    path: Path
+    mime: str
+    original_bytes: int
+    original_size: Tuple[int, int]
+    prepared_bytes: int
+    prepared_size: Tuple[int, int]
+
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{base64.b64encode(self.path.read_bytes()).decode('ascii')}"
+
+
+class ImagePreprocessor:
+    """Download-once, crop, downscale and re-encode store; safe to share between threads."""
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Tuple[bytes, str]],
+        root: Path = DEFAULT_PREP_DIR,
+        max_side: int = 768,
+        fmt: str = "webp",
+        quality: int = 80,
+        detail: str = "high",
+        crop: bool = True,
+        ttl_seconds: float = 30 * 24 * 3600,
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown image format {fmt!r}; expected one of {sorted(FORMATS)}")
+        if detail not in DETAILS:
+            raise ValueError(f"Unknown detail level {detail!r}; expected one of {DETAILS}")
+        self.fetch = fetch
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_side = max_side
+        self.fmt = fmt
+        self.quality = quality
+        self.detail = detail
+        self.crop = crop
+        self.ttl_seconds = ttl_seconds
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / "index.sqlite"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            " url TEXT PRIMARY KEY, digest TEXT NOT NULL, bytes INTEGER NOT NULL,"
+            " width INTEGER NOT NULL, height INTEGER NOT NULL, checked REAL NOT NULL)"
+        )
+
+    @classmethod
+    def from_env(cls, fetch: Callable[[str], Tuple[bytes, str]]) -> "ImagePreprocessor":
+        """IMAGE_PREP_MAX_SIDE / IMAGE_PREP_FORMAT / IMAGE_PREP_QUALITY / IMAGE_DETAIL / IMAGE_PREP_CROP."""
+        return cls(
+            fetch,
+            max_side=int(os.getenv("IMAGE_PREP_MAX_SIDE", 768)),
+            fmt=os.getenv("IMAGE_PREP_FORMAT", "webp").lower(),
+            quality=int(os.getenv("IMAGE_PREP_QUALITY", 80)),
+            detail=os.getenv("IMAGE_DETAIL", "high").lower(),
+            crop=os.getenv("IMAGE_PREP_CROP", "1") != "0",
+        )
+
+    @property
+    def signature(self) -> str:
+        """Everything about the preparation that changes what the model sees."""
+        return f"{self.max_side}:{self.fmt}:{self.quality}:{int(self.crop)}:{self.detail}"
+
+    def prepare(self, url: str, refresh: bool = False) -> PreparedImage:
+        """
+        Prepared image for ``url``; downloads and encodes only when the URL is new, its entry
+        is older than ``ttl_seconds`` or ``refresh`` is set. Unchanged content is not re-encoded.
+        """
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT digest, bytes, width, height, checked FROM images WHERE url = ?", (url,)
+            ).fetchone()
+        if row is not None and not refresh and time.time() - row[4] <= self.ttl_seconds:
+            digest, n_bytes, width, height, _checked = row
+            path = self._path(digest)
+            if path.exists():
+                return self._prepared(digest, path, n_bytes, (width, height))
+
+        data, _mime = self.fetch(url)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        with Image.open(io.BytesIO(data)) as img:
+            original_size = img.size
+            if not path.exists():
+                self._write(path, self._encode(img))
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO images (url, digest, bytes, width, height, checked) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, digest, len(data), original_size[0], original_size[1], time.time()),
+            )
+        return self._prepared(digest, path, len(data), original_size)
+
+    # ---------- internals ----------
+    def _path(self, digest: str) -> Path:
+        ext = "jpg" if self.fmt == "jpeg" else self.fmt
+        return self.root / digest[:2] / f"{digest}.{self.max_side}.{int(self.crop)}.q{self.quality}.{ext}"
+
+    def _prepared(self, digest: str, path: Path, n_bytes: int, original_size: Tuple[int, int]) -> PreparedImage:
+        with Image.open(path) as img:
+            prepared_size = img.size
+        return PreparedImage(
+            digest=digest,
+            path=path,
+            mime=FORMATS[self.fmt][1],
+            original_bytes=n_bytes,
+            original_size=original_size,
+            prepared_bytes=path.stat().st_size,
+            prepared_size=prepared_size,
+        )
+
+    def _encode(self, img: Image.Image) -> bytes:
+        img = img.convert("RGB")
+        if self.crop:
+            img = trim_border(img)
+        img.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format=FORMATS[self.fmt][0], quality=self.quality, optimize=True)
+        return out.getvalue()
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)                  # atomic: concurrent readers never see half a file
+
+
+def trim_border(img: Image.Image, tolerance: int = 12, margin: float = 0.02) -> Image.Image:
+    """Crop the uniform background around the product (colour of the top-left pixel)."""
+    background = Image.new(img.mode, img.size, img.getpixel((0, 0)))
+    diff = ImageChops.difference(img, background).convert("L").point(lambda v: 255 if v > tolerance else 0)
+    box = diff.getbbox()
+    if box is None:
+        return img
+    pad_x, pad_y = int(img.width * margin), int(img.height * margin)
+    box = (max(0, box[0] - pad_x), max(0, box[1] - pad_y), min(img.width, box[2] + pad_x), min(img.height, box[3] + pad_y))
+    return img.crop(box) if box != (0, 0, img.width, img.height) else img
+
+
+class PrepReport:
+    """Per-meta totals of bytes and estimated vision tokens, original vs prepared."""
+
+    FIELDS = ("images", "original_bytes", "prepared_bytes", "original_tokens", "prepared_tokens")
+
+    def __init__(self):
+        self._totals: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, meta: str, image: PreparedImage, detail: str, model: str) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(meta, dict.fromkeys(self.FIELDS, 0))
+            totals["images"] += 1
+            totals["original_bytes"] += image.original_bytes
+            totals["prepared_bytes"] += image.prepared_bytes
+            # the API would have fetched the original at detail=auto (≈ high)
+            totals["original_tokens"] += vision_tokens(*image.original_size, detail="high", model=model)
+            totals["prepared_tokens"] += vision_tokens(*image.prepared_size, detail=detail, model=model)
+
+    def summary(self, meta: str) -> Optional[str]:
+        with self._lock:
+            t = self._totals.get(meta)
+        if not t or not t["images"]:
+            return None
+        saved_mb = (t["original_bytes"] - t["prepared_bytes"]) / 1e6
+        saved_tokens = t["original_tokens"] - t["prepared_tokens"]
+        share = saved_tokens / t["original_tokens"] if t["original_tokens"] else 0.0
+        return (
+            f"{t['images']} images: {t['original_bytes'] / 1e6:.1f} MB → {t['prepared_bytes'] / 1e6:.1f} MB "
+            f"(saved {saved_mb:.1f} MB), ≈{t['original_tokens']:,} → {t['prepared_tokens']:,} image tokens "
+            f"(saved ≈{saved_tokens:,}, {share:.0%})"
+        )
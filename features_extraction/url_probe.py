@@ -0,0 +1,175 @@
+"""Bulk reachability checks for image URLs.
+
+:class:`UrlProber` fans probes out over a thread pool. Each thread keeps its own
+``requests.Session`` so connections to a CDN are reused, and a per-host
+semaphore caps how many probes hit one host at once. A probe is a ``HEAD``,
+followed by a streamed ``GET`` (headers only) when the server rejects ``HEAD``.
+
+Results (status, content type, size, check time) are stored in SQLite and reused
+for ``ttl_seconds``. Failures are kept for the shorter ``failure_ttl_seconds``,
+so a transient outage is retried on the next run.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_PROBE_CACHE_PATH = Path(
+    os.getenv("URL_PROBE_CACHE_PATH", Path(__file__).resolve().parent.parent / "data" / "url_probe.sqlite")
+).expanduser()
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0",           # some CDNs reject default client agents
+    "Accept": "image/avif,image/webp,image/*,*/*;q=0.8",
+}
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    url: str
+    status: int                  # HTTP status; 0 — network error
+    content_type: Optional[str]
+    size: Optional[int]          # Content-Length, if the server sent it
+    checked: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200
+
+
+class UrlProber:
+    """Pooled, per-host-limited URL prober with a persistent TTL cache."""
+
+    def __init__(
+        self,
+        cache_path: Optional[Path] = DEFAULT_PROBE_CACHE_PATH,
+        concurrency: int = 32,
+        per_host: int = 8,
+        timeout: float = 5.0,
+        ttl_seconds: float = 7 * 24 * 3600,
+        failure_ttl_seconds: float = 3600,
+    ):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.ttl_seconds = ttl_seconds
+        self.failure_ttl_seconds = failure_ttl_seconds
+        self._local = threading.local()
+        self._hosts: Dict[str, threading.BoundedSemaphore] = {}
+        self._hosts_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = self._open(Path(cache_path)) if cache_path else None
+
+    def _open(self, path: Path) -> sqlite3.Connection:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=30.0)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            " url TEXT PRIMARY KEY, status INTEGER NOT NULL, content_type TEXT, size INTEGER,"
+            " checked REAL NOT NULL, error TEXT)"
+        )
+        return db
+
+    # ---------- public API ----------
+    def probe(self, url: str) -> ProbeResult:
+        cached = self.cached([url])
+        return cached[url] if url in cached else self._probe_and_store(url)
+
+    def probe_iter(self, urls: Iterable[str]) -> Iterator[ProbeResult]:
+        """Results as they become available: cached ones first, then fresh probes as they finish."""
+        pending: List[str] = list(dict.fromkeys(u for u in urls if u))
+        cached = self.cached(pending)
+        yield from cached.values()
+        pending = [u for u in pending if u not in cached]
+        if not pending:
+            return
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="url-probe") as pool:
+            for future in as_completed([pool.submit(self._probe_and_store, u) for u in pending]):
+                yield future.result()
+
+    def probe_many(self, urls: Iterable[str]) -> Dict[str, ProbeResult]:
+        return {r.url: r for r in self.probe_iter(urls)}
+
+    def cached(self, urls: List[str]) -> Dict[str, ProbeResult]:
+        """Fresh cache entries for ``urls``."""
+        if self._db is None or not urls:
+            return {}
+        now = time.time()
+        found: Dict[str, ProbeResult] = {}
+        with self._db_lock:
+            for start in range(0, len(urls), 500):           # SQLite parameter limit
+                batch = urls[start:start + 500]
+                rows = self._db.execute(
+                    "SELECT url, status, content_type, size, checked, error FROM probes"
+                    f" WHERE url IN ({', '.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for row in rows:
+                    result = ProbeResult(*row)
+                    ttl = self.ttl_seconds if result.ok else self.failure_ttl_seconds
+                    if now - result.checked <= ttl:
+                        found[result.url] = result
+        return found
+
+    # ---------- internals ----------
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=64, pool_maxsize=self.per_host)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HEADERS)
+        return session
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._hosts_lock:
+            slot = self._hosts.get(host)
+            if slot is None:
+                slot = self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return slot
+
+    def _probe_and_store(self, url: str) -> ProbeResult:
+        with self._host_slot(url):
+            result = self._probe(url)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO probes (url, status, content_type, size, checked, error)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (result.url, result.status, result.content_type, result.size, result.checked, result.error),
+                )
+        return result
+
+    def _probe(self, url: str) -> ProbeResult:
+        session = self._session()
+        try:
+            resp = session.head(url, timeout=self.timeout, allow_redirects=True)
+            if resp.status_code != 200:
+                # some servers do not support HEAD; a streamed GET reads headers only
+                resp = session.get(url, timeout=self.timeout, stream=True, allow_redirects=True)
+                resp.close()
+        except requests.RequestException as e:
+            return ProbeResult(url, 0, None, None, time.time(), f"{type(e).__name__}: {e}"[:300])
+        size = resp.headers.get("content-length")
+        return ProbeResult(
+            url,
+            resp.status_code,
+            resp.headers.get("content-type"),
+            int(size) if size and size.isdigit() else None,
+            time.time(),
+        )
@@ -0,0 +1,93 @@
+# feedback_store.py
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+
+class FeedbackStore:
+    """
+    Отзывы пользователей в SQLite (WAL): добавление отзыва — одна вставка O(1),
+    без перечитывания и перезаписи всего файла; параллельные сессии пишут безопасно.
+    Вместе с отзывом сохраняются сгенерированный лук и выбранные SKU — для обучения ранжирования.
+    """
+
+    COLUMNS = ("created", "user_query", "selected_look", "comment", "model", "look_json", "skus_json")
+
+    def __init__(self, path: Path, legacy_csv: Optional[Path] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS feedback ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created REAL NOT NULL, user_query TEXT, selected_look TEXT, comment TEXT,"
+            " model TEXT, look_json TEXT, skus_json TEXT)"
+        )
+        if legacy_csv is not None:
+            self._import_legacy(Path(legacy_csv))
+
+    def _import_legacy(self, csv_path: Path) -> None:
+        """Однократный перенос старого users_feedback.csv, пока таблица пуста."""
+        if not csv_path.exists():
+            return
+        with self._lock:
+            if self._conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]:
+                return
+            legacy = pd.read_csv(csv_path).fillna("")
+            rows = [
+                (0.0, r.get("user_query", ""), r.get("selected_look", ""), r.get("comment", ""), None, None, None)
+                for r in legacy.to_dict("records")
+            ]
+            self._conn.executemany(
+                f"INSERT INTO feedback ({', '.join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def add(
+        self,
+        user_query: str,
+        selected_look: str,
+        comment: str = "",
+        model: Optional[str] = None,
+        look: Optional[Dict[str, Any]] = None,
+        skus: Optional[List[Dict[str, Any]]] = None,
+    ) -> int:
+        """Добавляет отзыв; `look` — OneTotalLook.model_dump(), `skus` — выбранные вещи образа."""
+        row = (
+            time.time(),
+            user_query,
+            selected_look,
+            comment,
+            model,
+            json.dumps(look, ensure_ascii=False) if look is not None else None,
+            json.dumps(skus, ensure_ascii=False, default=_json_scalar) if skus is not None else None,
+        )
+        with self._lock:
+            cur = self._conn.execute(
+                f"INSERT INTO feedback ({', '.join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)", row
+            )
+            return cur.lastrowid
+
+    def read(self) -> pd.DataFrame:
+        """Все отзывы одной выборкой — для анализа, не для горячего пути."""
+        with self._lock:
+            return pd.read_sql_query("SELECT * FROM feedback ORDER BY id", self._conn)
+
+    def export_parquet(self, out_path: Path) -> int:
+        """Снимок отзывов в Parquet (периодическая выгрузка для обучения ранжирования)."""
+        df = self.read()
+        df.to_parquet(out_path, index=False)
+        return len(df)
+
+
+def _json_scalar(value: Any) -> Any:
+    """numpy-скаляры из строк каталога (good_id, store_id) — числами, остальное — строкой."""
+    return value.item() if hasattr(value, "item") else str(value)
@@ -0,0 +1,183 @@
+# image_cache.py
+from __future__ import annotations
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from PIL import Image
+
+
+DEFAULT_CACHE_DIR = Path(
+    os.getenv("IMAGE_CACHE_DIR", Path(__file__).resolve().parent / "data" / "image_cache")
+).expanduser()
+
+
+class ImageCache:
+    """
+    Локальный кэш миниатюр товаров. Картинка скачивается один раз, уменьшается до
+    `max_side` и хранится по хэшу содержимого (одинаковые фото с разных CDN — один файл);
+    сопоставление URL → файл и недоступные URL (негативный кэш) лежат в SQLite.
+    Постоянные ошибки (4xx, битая картинка) помним `negative_ttl`, временные (таймаут,
+    обрыв соединения, 429/5xx) — короткий `transient_ttl`, чтобы разовый сбой CDN не прятал фото на сутки.
+    Префетчер — ограниченный пул потоков, который начинает загрузку картинок луков сразу после их сборки.
+    """
+
+    def __init__(
+        self,
+        root: Path = DEFAULT_CACHE_DIR,
+        max_side: int = 512,
+        workers: int = 8,
+        timeout: float = 10.0,
+        negative_ttl: float = 24 * 3600,
+        transient_ttl: float = 3600,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_side = max_side
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.transient_ttl = transient_ttl
+
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / "index.sqlite"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            " url TEXT PRIMARY KEY, digest TEXT, error TEXT, checked REAL NOT NULL,"
+            " transient INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(urls)")}
+        if "transient" not in columns:             # индекс от прошлой версии
+            self._db.execute("ALTER TABLE urls ADD COLUMN transient INTEGER NOT NULL DEFAULT 0")
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="img-prefetch")
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._local = threading.local()     # requests.Session на поток — keep-alive к CDN
+
+    # --- публичный API ---
+    def prefetch(self, urls: Iterable[str]) -> List[Future]:
+        """
+        Ставит загрузку в фон; уже закэшированные URL пропускаются, для уже загружаемых
+        возвращается тот же future. Futures можно дождаться разом через concurrent.futures.wait.
+        """
+        futures = {}
+        for url in urls:
+            if url and url not in futures and self._lookup(url) is None:
+                futures[url] = self._submit(url)
+        return list(futures.values())
+
+    def get(self, url: str, timeout: Optional[float] = None) -> Optional[Path]:
+        """
+        Путь к локальной миниатюре или None, если URL недоступен.
+        Если картинка уже качается префетчером — ждем ее не дольше `timeout`.
+        """
+        if not url:
+            return None
+        known = self._lookup(url)
+        if known is not None:
+            digest, error = known
+            return None if error else self._path(digest)
+        future = self._submit(url)
+        done, _ = wait([future], timeout=timeout if timeout is not None else self.timeout * 2)
+        return future.result() if done else None
+
+    def path_or_url(self, url: str, timeout: Optional[float] = None) -> Optional[str]:
+        """Для st.image: локальный файл; если он еще грузится — исходный URL; None — URL мертв."""
+        path = self.get(url, timeout)
+        if path is not None:
+            return str(path)
+        known = self._lookup(url)
+        return None if known is not None and known[1] else url
+
+    # --- внутреннее ---
+    def _submit(self, url: str) -> Future:
+        with self._inflight_lock:
+            future = self._inflight.get(url)
+            if future is None:
+                future = self._inflight[url] = self._pool.submit(self._fetch, url)
+                future.add_done_callback(lambda _f, u=url: self._forget(u))
+            return future
+
+    def _forget(self, url: str) -> None:
+        with self._inflight_lock:
+            self._inflight.pop(url, None)
+
+    def _lookup(self, url: str) -> Optional[tuple]:
+        """(digest, error) из индекса; устаревшая негативная запись считается отсутствующей."""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT digest, error, checked, transient FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        digest, error, checked, transient = row
+        if error and time.time() - checked > (self.transient_ttl if transient else self.negative_ttl):
+            return None
+        if not error and not self._path(digest).exists():
+            return None
+        return digest, error
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.jpg"
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _fetch(self, url: str) -> Optional[Path]:
+        headers = {
+            "User-Agent": "Mozilla/5.0",           # некоторые CDN режут «ботов»
+            "Referer": url.rsplit("/", 1)[0],      # помогает против hotlink-защиты
+            "Accept": "image/avif,image/webp,image/*,*/*;q=0.8",
+        }
+        try:
+            resp = self._session().get(url, timeout=self.timeout, headers=headers)
+            resp.raise_for_status()
+            thumb = self._thumbnail(resp.content)
+        except Exception as e:                     # сеть, HTTP-ошибка, битая картинка
+            self._record(url, None, f"{type(e).__name__}: {e}"[:300], transient=_is_transient(e))
+            return None
+
+        digest = hashlib.sha256(thumb).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(thumb)
+            os.replace(tmp, path)                  # атомарно: читатели не увидят полфайла
+        self._record(url, digest, None)
+        return path
+
+    def _thumbnail(self, content: bytes) -> bytes:
+        with Image.open(io.BytesIO(content)) as img:
+            img = img.convert("RGB")
+            img.thumbnail((self.max_side, self.max_side))
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=85, optimize=True)
+            return out.getvalue()
+
+    def _record(self, url: str, digest: Optional[str], error: Optional[str], transient: bool = False) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO urls (url, digest, error, checked, transient) VALUES (?, ?, ?, ?, ?)",
+                (url, digest, error, time.time(), int(transient)),
+            )
+
+
+def _is_transient(e: Exception) -> bool:
+    """Сбой, который стоит повторить скоро: таймаут, обрыв соединения, 429 и 5xx."""
+    if isinstance(e, (requests.Timeout, requests.ConnectionError)):
+        return True
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return False
@@ -0,0 +1,213 @@
+# llm_backend.py
+"""
+Бэкенды LLM за одним интерфейсом: `parse(**request) -> LLMResult`, где request — те же
+аргументы, что у `client.beta.chat.completions.parse` (model, messages, response_format, ...).
+
+* OpenAIBackend — настоящий API (клиенты создает вызывающий код);
+* StubBackend — локальная детерминированная заглушка для нагрузочных тестов: ответ строится
+  по схеме response_format, задержка берется из распределения LatencyModel.
+
+Выбор через окружение: LLM_BACKEND=openai|stub, LLM_STUB_LATENCY="lognormal:0.8:0.4", LLM_STUB_SEED=0.
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import typing
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Sequence, Union
+
+from pydantic import BaseModel
+
+
+@dataclass
+class LLMResult:
+    parsed: BaseModel           # экземпляр response_format
+    total_tokens: int = 0
+
+
+class LLMBackend(ABC):
+    """Базовый интерфейс; async-вариант по умолчанию выполняет sync-вызов в потоке."""
+    name = "base"
+
+    @abstractmethod
+    def parse(self, **request: Any) -> LLMResult:
+        ...
+
+    async def aparse(self, **request: Any) -> LLMResult:
+        return await asyncio.to_thread(self.parse, **request)
+
+    def with_options(self, **options: Any) -> "LLMBackend":
+        """Аналог client.with_options (max_retries, timeout); бэкенды без опций возвращают себя."""
+        return self
+
+
+class OpenAIBackend(LLMBackend):
+    """Structured outputs через OpenAI SDK; фабрики клиентов позволяют переиспользовать общий пул."""
+    name = "openai"
+
+    def __init__(self, client_factory: Callable[[], Any], async_client_factory: Optional[Callable[[], Any]] = None):
+        self._client_factory = client_factory
+        self._async_client_factory = async_client_factory
+
+    def parse(self, **request: Any) -> LLMResult:
+        return self._result(self._client_factory().beta.chat.completions.parse(**request))
+
+    async def aparse(self, **request: Any) -> LLMResult:
+        if self._async_client_factory is None:
+            return await super().aparse(**request)
+        return self._result(await self._async_client_factory().beta.chat.completions.parse(**request))
+
+    def with_options(self, **options: Any) -> "OpenAIBackend":
+        sync_factory, async_factory = self._client_factory, self._async_client_factory
+        return OpenAIBackend(
+            lambda: sync_factory().with_options(**options),
+            (lambda: async_factory().with_options(**options)) if async_factory else None,
+        )
+
+    @staticmethod
+    def _result(response) -> LLMResult:
+        # .parse() возвращает специальный объект, сама модель в .choices[0].message.parsed
+        tokens = response.usage.total_tokens if response.usage else 0
+        return LLMResult(parsed=response.choices[0].message.parsed, total_tokens=tokens)
+
+
+# ---------- stub ----------
+class LatencyModel:
+    """
+    Распределение времени ответа заглушки, секунды. Спецификация строкой:
+    "const:0.5", "uniform:0.2:1.5", "lognormal:<медиана>:<sigma>" (хвост как у реального API).
+    """
+
+    def __init__(self, kind: str = "const", a: float = 0.0, b: float = 0.0):
+        if kind not in ("const", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind, self.a, self.b = kind, a, b
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, *params = spec.strip().split(":")
+        values = [float(p) for p in params] + [0.0, 0.0]
+        return cls(kind, values[0], values[1])
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "const":
+            return self.a
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        return rng.lognormvariate(math.log(self.a), self.b) if self.a > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return f"LatencyModel({self.kind}:{self.a}:{self.b})"
+
+
+# Слова для строковых полей заглушки — чтобы ответы находили товары в каталоге
+CANNED_WORDS: Dict[str, Sequence[str]] = {
+    "sex": ("female", "male", "unisex"),
+    "season": ("летний", "зимний", "демисезонный"),
+    "category": ("платье", "блузка", "брюки", "джинсы", "юбка", "свитер", "туфли", "кроссовки", "пальто", "сумка"),
+    "color": ("черный", "белый", "серый", "бежевый", "синий", "розовый", "светлый"),
+    "fabric": ("хлопок", "шелк", "шерсть", "кожа", "лен", "деним"),
+    "pattern": ("клетка", "полоска", "цветы", "горох"),
+    "detailes": ("пуговицы", "карманы", "пояс"),
+}
+
+
+class StubBackend(LLMBackend):
+    """
+    Детерминированная заглушка: одинаковый запрос (model + messages + seed) всегда дает
+    одинаковый ответ и одинаковую задержку. `canned` — готовые ответы по имени схемы
+    (например, {"OneTotalLook": LOOKS}); для остальных схем ответ синтезируется по полям модели.
+    """
+    name = "stub"
+
+    def __init__(
+        self,
+        latency: Union[LatencyModel, str] = "const:0",
+        seed: int = 0,
+        canned: Optional[Dict[str, Sequence[BaseModel]]] = None,
+    ):
+        self.latency = LatencyModel.parse(latency) if isinstance(latency, str) else latency
+        self.seed = seed
+        self.canned = dict(canned or {})
+        self.calls = 0
+        self._calls_lock = threading.Lock()     # parse зовут из пула сервиса и воркеров EnrichmentEngine
+
+    def parse(self, **request: Any) -> LLMResult:
+        result, delay = self._respond(request)
+        time.sleep(delay)
+        return result
+
+    async def aparse(self, **request: Any) -> LLMResult:
+        result, delay = self._respond(request)
+        await asyncio.sleep(delay)
+        return result
+
+    def _respond(self, request: Dict[str, Any]) -> tuple:
+        with self._calls_lock:
+            self.calls += 1
+        schema = request["response_format"]
+        prompt = json.dumps([request.get("model"), request.get("messages")], ensure_ascii=False, sort_keys=True, default=str)
+        digest = hashlib.sha256(f"{self.seed}\x1f{prompt}".encode("utf-8")).digest()
+        rng = random.Random(int.from_bytes(digest[:8], "big"))
+
+        answers = self.canned.get(schema.__name__)
+        parsed = answers[rng.randrange(len(answers))] if answers else canned_instance(schema, rng)
+        # грубая оценка токенов: ~4 символа на токен
+        tokens = (len(prompt) + len(parsed.model_dump_json())) // 4
+        return LLMResult(parsed=parsed, total_tokens=tokens), self.latency.sample(rng)
+
+
+def canned_instance(schema: type, rng: random.Random) -> BaseModel:
+    """Валидный экземпляр pydantic-схемы со случайными (но воспроизводимыми по rng) значениями."""
+    data = {
+        name: _canned_value(name, field.annotation, field.metadata, rng)
+        for name, field in schema.model_fields.items()
+    }
+    return schema.model_validate(data)
+
+
+def _canned_value(name: str, annotation: Any, metadata: list, rng: random.Random) -> Any:
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin is typing.Annotated:
+        return _canned_value(name, args[0], [*metadata, *args[1:]], rng)
+    if origin is Union:
+        options = [a for a in args if a is not type(None)]
+        if len(options) < len(args) and rng.random() < 0.3:
+            return None
+        return _canned_value(name, options[0], metadata, rng)
+    if origin in (list, tuple, set):
+        length = max([getattr(m, "min_length", None) or 0 for m in metadata] or [0]) or rng.randint(1, 2)
+        return [_canned_value(name, args[0] if args else str, [], rng) for _ in range(length)]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return canned_instance(annotation, rng).model_dump()
+    if origin is typing.Literal:
+        return rng.choice(args)
+    if annotation is bool:
+        return rng.random() < 0.5
+    if annotation in (int, float):
+        lo = next((v for m in metadata if (v := getattr(m, "ge", None)) is not None), 0)
+        hi = next((v for m in metadata if (v := getattr(m, "le", None)) is not None), 100)
+        return rng.randint(int(lo), int(hi)) if annotation is int else round(rng.uniform(lo, hi), 3)
+    words = CANNED_WORDS.get(name)
+    return rng.choice(words) if words else f"{name}-{rng.randrange(4)}"
+
+
+# ---------- выбор по окружению ----------
+def backend_from_env(openai_factory: Callable[[], LLMBackend]) -> LLMBackend:
+    """LLM_BACKEND=stub → StubBackend из LLM_STUB_* переменных, иначе — openai_factory()."""
+    kind = os.getenv("LLM_BACKEND", "openai").strip().lower()
+    if kind == "stub":
+        return StubBackend(
+            latency=os.getenv("LLM_STUB_LATENCY", "const:0"),
+            seed=int(os.getenv("LLM_STUB_SEED", 0)),
+        )
+    if kind == "openai":
+        return openai_factory()
+    raise ValueError(f"Unknown LLM_BACKEND: {kind}")
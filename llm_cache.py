@@ -0,0 +1,167 @@
+# llm_cache.py
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from prompts import OneTotalLook
+
+
+DEFAULT_CACHE_PATH = Path(
+    os.getenv("LOOK_CACHE_PATH", Path(__file__).resolve().parent / "data" / "look_cache.sqlite")
+).expanduser()
+
+
+def normalize_query(user_text: str) -> str:
+    """Нормализует запрос для ключа кэша: регистр и пробелы не влияют на результат."""
+    return " ".join(user_text.lower().split())
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(user_text: str, model: str, prompt: str, backend: str) -> str:
+    """
+    Ключ = хэш (нормализованный запрос, модель, хэш промпта, бэкенд LLM).
+    Бэкенд в ключе не дает ответам заглушки (LLM_BACKEND=stub) попасть к настоящим запросам.
+    """
+    raw = "\x1f".join([normalize_query(user_text), model, prompt_hash(prompt), backend])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LookCache:
+    """
+    Двухуровневый кэш ответов generate_look: LRU в памяти процесса + SQLite на диске.
+    Генерация идет с temperature=0.0, поэтому одинаковый (запрос, модель, промпт)
+    дает одинаковый OneTotalLook, и повторный вызов LLM не нужен.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = DEFAULT_CACHE_PATH,
+        max_memory_items: int = 256,
+        max_disk_items: int = 50_000,
+        ttl_seconds: float = 7 * 24 * 3600,
+    ):
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._miss_seconds = 0.0
+        self._miss_tokens = 0
+        self._conn = self._open(path) if path else None
+
+    def _open(self, path: Path) -> Optional[sqlite3.Connection]:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS looks ("
+                " key TEXT PRIMARY KEY, payload TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS looks_accessed ON looks(accessed)")
+            return conn
+        except (sqlite3.Error, OSError) as e:
+            # например, read-only каталог в контейнере — работаем только с памятью
+            warnings.warn(f"Look cache on disk disabled ({path}): {e}")
+            return None
+
+    # --- чтение / запись ---
+    def get(self, key: str) -> Optional[OneTotalLook]:
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None and now - hit[0] <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return OneTotalLook.model_validate_json(hit[1])
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT payload, created FROM looks WHERE key = ? AND created >= ?",
+                    (key, now - self.ttl_seconds),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE looks SET accessed = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[1], row[0])
+                    self._counters["disk_hits"] += 1
+                    return OneTotalLook.model_validate_json(row[0])
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, look: OneTotalLook, seconds: float = 0.0, tokens: int = 0) -> None:
+        """Сохраняет лук; seconds/tokens — цена промаха, по ней оценивается экономия."""
+        payload = look.model_dump_json()
+        now = time.time()
+        with self._lock:
+            self._miss_seconds += seconds
+            self._miss_tokens += tokens
+            self._remember(key, now, payload)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO looks (key, payload, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, payload, now, now),
+                )
+                self._evict(now)
+
+    def _remember(self, key: str, created: float, payload: str) -> None:
+        self._memory[key] = (created, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM looks WHERE created < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM looks WHERE key IN ("
+            " SELECT key FROM looks ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_items,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM looks")
+
+    # --- статистика ---
+    def stats(self) -> Dict[str, float]:
+        """Счетчики попаданий/промахов и оценка сэкономленных секунд и токенов LLM."""
+        with self._lock:
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            misses = self._counters["misses"]
+            paid = max(misses, 1)
+            return {
+                **self._counters,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "memory_items": len(self._memory),
+                "saved_seconds_est": hits * self._miss_seconds / paid,
+                "saved_tokens_est": hits * self._miss_tokens / paid,
+            }
+
+
+_default_cache: Optional[LookCache] = None
+_default_lock = threading.Lock()
+
+
+def get_look_cache() -> Optional[LookCache]:
+    """Кэш процесса по умолчанию; LOOK_CACHE_DISABLED=1 отключает кэширование."""
+    global _default_cache
+    if os.getenv("LOOK_CACHE_DISABLED") == "1":
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LookCache()
+        return _default_cache
@@ -0,0 +1,54 @@
+# ranking.py
+from __future__ import annotations
+from typing import Dict, Optional
+
+import numpy as np
+
+
+# Вес совпавшего признака в итоговом скоре кандидата
+ATTRIBUTE_WEIGHTS: Dict[str, float] = {
+    "category": 1.0,      # совпал category_id[0], а не только слово в name
+    "color": 2.0,
+    "color_field": 0.5,   # цвет найден в колонке color, а не в name
+    "fabric": 1.0,
+    "pattern": 1.0,
+    "detailes": 0.5,
+    "season": 0.75,
+}
+# Вес уверенности экстрактора признаков (колонка confidence, 0..1)
+CONFIDENCE_WEIGHT = 1.0
+
+
+def score_candidates(
+    masks: Dict[str, np.ndarray],
+    n: int,
+    confidence: Optional[np.ndarray] = None,
+    weights: Dict[str, float] = ATTRIBUTE_WEIGHTS,
+) -> np.ndarray:
+    """Скор всех кандидатов одним векторным проходом: взвешенная сумма масок + уверенность."""
+    scores = np.zeros(n, dtype=np.float64)
+    for attr, mask in masks.items():
+        weight = weights.get(attr)
+        if weight:
+            scores += weight * mask
+    if confidence is not None:
+        scores += CONFIDENCE_WEIGHT * confidence
+    return scores
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Индексы k лучших кандидатов по убыванию скора; при равенстве — в исходном порядке.
+    Частичная сортировка (np.partition) — O(n), полностью сортируются только k отобранных.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        idx = np.arange(n)
+    else:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[: k - len(above)]
+        idx = np.concatenate([above, ties])
+    return idx[np.lexsort((idx, -scores[idx]))]
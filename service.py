@@ -0,0 +1,166 @@
+# service.py
+"""
+Headless HTTP API стилиста (без Streamlit).
+
+Один процесс держит один каталог и индекс в памяти; матчинг и сборка образов идут
+в общем пуле потоков, вызовы LLM — асинхронно через agenerate_look с ограничением
+параллельности. Запуск:
+
+    uvicorn service:app --host 0.0.0.0 --port 8000
+
+Для локальных тестов без ключа OpenAI и сети: LLM_BACKEND=stub (детерминированная заглушка
+из llm_backend, задержка — LLM_STUB_LATENCY), каталог — DATA_PATH.
+"""
+from __future__ import annotations
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import openai
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+from assembler import assemble_looks
+from catalog import CatalogIndex, default_catalog_path
+from catalog_manager import CatalogManager
+from prompts import OneTotalLook
+from stylist_core import agenerate_look, filter_dataset
+from telemetry import REGISTRY, span
+
+
+DEFAULT_MODEL = os.getenv("STYLIST_MODEL", "gpt-4.1-mini")
+WORKERS = int(os.getenv("STYLIST_WORKERS", os.cpu_count() or 4))
+LLM_CONCURRENCY = int(os.getenv("STYLIST_LLM_CONCURRENCY", 16))
+DELTA_POLL_SECONDS = float(os.getenv("CATALOG_DELTA_POLL_SECONDS", 30))
+SKU_COLUMNS = ("good_id", "store_id", "name", "color", "image_external_url")
+
+
+# ---------- схемы запросов ----------
+class GenerateRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    model: str = DEFAULT_MODEL
+
+
+class FilterRequest(BaseModel):
+    look: OneTotalLook
+    max_per_item: int = Field(10, ge=1, le=500)
+    use_unisex: bool = True
+
+
+class AssembleRequest(BaseModel):
+    """Готовый `look` или `query`, по которому лук сначала генерируется."""
+    look: Optional[OneTotalLook] = None
+    query: Optional[str] = None
+    model: str = DEFAULT_MODEL
+    n_looks: int = Field(2, ge=1, le=20)
+    max_per_item: int = Field(50, ge=1, le=500)
+    use_unisex: bool = True
+
+
+# ---------- жизненный цикл ----------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="stylist-worker")
+    loop = asyncio.get_running_loop()
+    # каталог грузится один раз и разделяется всеми потоками пула; дельты подхватываются в фоне
+    catalog = await loop.run_in_executor(pool, CatalogManager, default_catalog_path())
+    catalog.start(DELTA_POLL_SECONDS)
+    app.state.catalog = catalog
+    app.state.pool = pool
+    app.state.llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
+    yield
+    catalog.stop()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="Fashion Stylist API", lifespan=lifespan)
+
+
+# ---------- helpers ----------
+def _skus(df: pd.DataFrame) -> List[dict]:
+    """Строки каталога → JSON-совместимые записи с идентификаторами SKU."""
+    cols = [c for c in SKU_COLUMNS if c in df.columns]
+    values = [df[c].tolist() for c in cols]            # tolist() приводит numpy-типы к python
+    return [dict(zip(cols, row)) for row in zip(*values)]
+
+
+def _sku(row: pd.Series) -> dict:
+    """Одна строка каталога → запись SKU (numpy-скаляры приводятся к python)."""
+    return {c: (row[c].item() if hasattr(row[c], "item") else row[c]) for c in SKU_COLUMNS if c in row.index}
+
+
+async def _run(request: Request, fn, *args, **kwargs):
+    """CPU-работа (матчинг, сборка) — в общем пуле, чтобы не блокировать event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app.state.pool, functools.partial(fn, *args, **kwargs))
+
+
+async def _generate(request: Request, query: str, model: str) -> OneTotalLook:
+    async with request.app.state.llm_slots:
+        try:
+            return await agenerate_look(query, model=model)
+        except openai.APIError as e:
+            raise HTTPException(status_code=502, detail=f"LLM error: {e}") from e
+
+
+async def _filter(request: Request, look: OneTotalLook, max_per_item: int, use_unisex: bool) -> Dict[str, pd.DataFrame]:
+    index: CatalogIndex = request.app.state.catalog.current()      # одна версия на весь запрос
+    return await _run(
+        request, filter_dataset, index.df, look,
+        max_per_item=max_per_item, use_unisex_choice=use_unisex, index=index,
+    )
+
+
+# ---------- endpoints ----------
+@app.get("/healthz")
+async def healthz(request: Request) -> dict:
+    index: CatalogIndex = request.app.state.catalog.current()
+    return {"status": "ok", "catalog_rows": index.n_rows, "catalog_version": index.version}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    return REGISTRY.to_prometheus()
+
+
+@app.post("/looks/generate")
+async def generate(request: Request, body: GenerateRequest) -> dict:
+    with span("api_generate"):
+        look = await _generate(request, body.query, body.model)
+    return {"look": look.model_dump()}
+
+
+@app.post("/looks/filter")
+async def filter_look(request: Request, body: FilterRequest) -> dict:
+    with span("api_filter"):
+        results = await _filter(request, body.look, body.max_per_item, body.use_unisex)
+    return {"parts": {part: _skus(df) for part, df in results.items()}}
+
+
+@app.post("/looks/assemble")
+async def assemble(request: Request, body: AssembleRequest) -> dict:
+    if body.look is None and not body.query:
+        raise HTTPException(status_code=422, detail="Either 'look' or 'query' is required")
+    with span("api_assemble"):
+        look = body.look or await _generate(request, body.query, body.model)
+        results = await _filter(request, look, body.max_per_item, body.use_unisex)
+        looks = await _run(request, assemble_looks, results, n_looks=body.n_looks)
+    return {
+        "look": look.model_dump(),
+        "outfits": [
+            {"score": assembled.score, "items": {slot: _sku(row) for slot, row in assembled.items.items()}}
+            for assembled in looks
+        ],
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # один процесс: несколько воркеров uvicorn держали бы по копии каталога
+    uvicorn.run(app, host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", 8000)))
@@ -0,0 +1,225 @@
+# sharded.py
+"""
+Шардированный матчинг для больших каталогов: каталог делится на шарды по URL картинки,
+каждый шард обслуживает свой процесс. Постинги шардов лежат в одном блоке разделяемой
+памяти (CSR: indptr + позиции), процессы поднимают поверх него CatalogIndex без копий
+и без DataFrame. Предикаты пакета рассылаются во все шарды одной задачей, а результаты
+сливаются точно так же, как их ранжировал бы один процесс (см. ShardedMatcher.rank_many).
+"""
+from __future__ import annotations
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from catalog import CatalogIndex
+from color_index import ColorIndex
+from prompts import Item
+from ranking import score_candidates, top_k
+from stylist_core import attribute_masks, cascade_levels, level_depth, select_level
+
+
+# (Item, пол, сезон) — один предикат матчинга
+MatchRequest = Tuple[Item, Optional[str], Optional[str]]
+
+
+class ShardedMatcher:
+    """
+    Пул процессов-шардов над `index`. Шард строки — код ее URL по модулю `n_shards`:
+    дубликаты картинки всегда в одном шарде, поэтому дедупликация остается локальной.
+    Версия индекса с дельтами предварительно сжимается в один сегмент.
+
+        with ShardedMatcher(index, n_shards=8) as matcher:
+            filter_dataset(index.df, look, max_per_item=50, matcher=matcher)
+    """
+
+    def __init__(self, index: CatalogIndex, n_shards: Optional[int] = None, start_method: str = "spawn"):
+        if index.segmented:
+            index = index.compacted()
+        self.index = index
+        self.n_shards = max(1, n_shards or os.cpu_count() or 1)
+
+        arrays, family_keys, meta = _split(index, self.n_shards)
+        layout, size = {}, 0
+        for name, arr in arrays.items():
+            size = (size + 7) // 8 * 8                 # выравнивание буферов
+            layout[name] = (size, arr.dtype.str, arr.shape)
+            size += arr.nbytes
+        self._executors: List[ProcessPoolExecutor] = []
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            for name, arr in arrays.items():
+                _view(self._shm, layout[name])[...] = arr
+            del arrays                                 # дальше постинги шардов живут только в shm
+
+            context = mp.get_context(start_method)
+            for shard in range(self.n_shards):
+                self._executors.append(ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self._shm.name, layout, family_keys, shard, meta[shard]),
+                ))
+            # поднимаем процессы сразу, чтобы первый запрос не платил за старт
+            for future in [ex.submit(_ready) for ex in self._executors]:
+                future.result()
+        except BaseException:
+            # шард не поднялся — останавливаем уже запущенные и освобождаем сегмент shm
+            self.close()
+            raise
+
+    def rank_many(self, requests: Sequence[MatchRequest], use_unisex: bool, k: int) -> List[np.ndarray]:
+        """
+        Позиции top-k строк для каждого предиката — те же, что дал бы stylist_core.rank_item.
+        Шарды возвращают счетчики уровней каскада и top-k на каждой глубине; глубина
+        выбирается по сумме счетчиков, а top-k сливаются по (скор, порядок выдачи).
+        """
+        if not requests:
+            return []
+        futures = [ex.submit(_rank_shard, list(requests), use_unisex, k) for ex in self._executors]
+        per_shard = [f.result() for f in futures]
+
+        results: List[np.ndarray] = []
+        for r in range(len(requests)):
+            counts = np.sum([shard[r][0] for shard in per_shard], axis=0, dtype=np.int64)
+            depth = level_depth(counts.tolist())
+            pos, score, not_color, name_only = (
+                np.concatenate(parts) for parts in zip(*(shard[r][1][depth] for shard in per_shard))
+            )
+            order = np.lexsort((pos, name_only, not_color, -score))[:k]
+            results.append(pos[order])
+        return results
+
+    def close(self) -> None:
+        for ex in self._executors:
+            ex.shutdown(wait=True)
+        self._executors = []
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self) -> "ShardedMatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# ---------- нарезка индекса (родительский процесс) ----------
+def _split(index: CatalogIndex, n_shards: int) -> Tuple[Dict[str, np.ndarray], Dict[str, list], List[dict]]:
+    """Постинги и колонки индекса → буферы шардов с локальными позициями (порядок строк сохраняется)."""
+    shard_of = index.url_codes % n_shards
+    local_of = np.empty(index.n_rows, dtype=np.int64)
+    arrays: Dict[str, np.ndarray] = {}
+    meta: List[dict] = []
+    for shard in range(n_shards):
+        global_ids = np.flatnonzero(shard_of == shard)
+        local_of[global_ids] = np.arange(len(global_ids))
+        arrays[f"{shard}/global_ids"] = global_ids
+        arrays[f"{shard}/url_codes"] = index.url_codes[global_ids]
+        if index.confidence is not None:
+            arrays[f"{shard}/confidence"] = index.confidence[global_ids]
+        meta.append({
+            "n_rows": len(global_ids),
+            "confidence": index.confidence is not None,
+            "colors": index.colors is not None,
+        })
+
+    if index.colors is not None:
+        color_shard = shard_of[index.colors.positions]
+        for shard in range(n_shards):
+            mask = color_shard == shard
+            arrays[f"{shard}/lab"] = index.colors.lab[mask]
+            arrays[f"{shard}/color_positions"] = local_of[index.colors.positions[mask]]
+
+    # семейство постингов (ключ → позиции) → CSR на каждый шард
+    family_keys: Dict[str, list] = {}
+    for family, postings in index.posting_families().items():
+        keys = list(postings)
+        family_keys[family] = keys
+        lengths = np.fromiter((len(postings[key]) for key in keys), dtype=np.int64, count=len(keys))
+        flat = np.concatenate([postings[key] for key in keys]) if keys else np.empty(0, dtype=np.int64)
+        key_ids = np.repeat(np.arange(len(keys)), lengths)
+        order = np.argsort(shard_of[flat], kind="stable")    # внутри шарда — прежний порядок ключей и позиций
+        flat, key_ids = flat[order], key_ids[order]
+        bounds = np.searchsorted(shard_of[flat], np.arange(n_shards + 1))
+        for shard in range(n_shards):
+            segment = slice(bounds[shard], bounds[shard + 1])
+            arrays[f"{shard}/{family}/ids"] = local_of[flat[segment]]
+            arrays[f"{shard}/{family}/indptr"] = np.searchsorted(key_ids[segment], np.arange(len(keys) + 1))
+    return arrays, family_keys, meta
+
+
+def _view(shm: shared_memory.SharedMemory, spec: tuple) -> np.ndarray:
+    offset, dtype, shape = spec
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+
+
+# ---------- процесс-шард ----------
+_shm: Optional[shared_memory.SharedMemory] = None
+_shard: Optional[CatalogIndex] = None
+_global_ids: Optional[np.ndarray] = None
+
+
+def _init_worker(shm_name: str, layout: Dict[str, tuple], family_keys: Dict[str, list], shard: int, meta: dict) -> None:
+    global _shm, _shard, _global_ids
+    _shm = shared_memory.SharedMemory(name=shm_name)
+
+    def view(name: str) -> np.ndarray:
+        arr = _view(_shm, layout[f"{shard}/{name}"])
+        arr.setflags(write=False)
+        return arr
+
+    families: Dict[str, Dict] = {}
+    for family, keys in family_keys.items():
+        indptr, ids = view(f"{family}/indptr"), view(f"{family}/ids")
+        families[family] = {
+            key: ids[indptr[i]:indptr[i + 1]] for i, key in enumerate(keys) if indptr[i + 1] > indptr[i]
+        }
+    colors = ColorIndex(view("lab"), view("color_positions")) if meta["colors"] else None
+    confidence = view("confidence") if meta["confidence"] else None
+    _shard = CatalogIndex.from_parts(meta["n_rows"], families, colors, confidence, view("url_codes"))
+    _global_ids = view("global_ids")
+
+
+def _ready() -> bool:
+    return _shard is not None
+
+
+def _rank_shard(requests: List[MatchRequest], use_unisex: bool, k: int) -> List[tuple]:
+    """
+    Для каждого предиката: (счетчики уровней каскада, [top-k на глубине 0..L]).
+    top-k — (глобальные позиции, скор, «цвет не из колонки color», «совпало только name»):
+    этих ключей достаточно, чтобы слить шарды в порядке выдачи rank_item.
+    """
+    out = []
+    for itm, sex, season in requests:
+        candidates, masks = attribute_masks(_shard, itm, _shard.gender_rows(sex, use_unisex), season)
+        levels = cascade_levels(masks, itm)
+        counts = [int(np.count_nonzero(level)) for level in levels]
+        confidence = _shard.confidence_at(candidates)
+        name_only = ~masks["category"]
+        not_color = ~masks["color_field"] if "color_field" in masks else np.zeros(len(candidates), dtype=bool)
+
+        tops = []
+        for depth in range(len(levels) + 1):
+            picked = select_level(candidates, masks, itm, depth)
+            scores = score_candidates(
+                {attr: mask[picked] for attr, mask in masks.items()},
+                len(picked),
+                confidence=confidence[picked] if confidence is not None else None,
+            )
+            best = top_k(scores, k)
+            chosen = picked[best]
+            tops.append((
+                _global_ids[candidates[chosen]],
+                scores[best],
+                not_color[chosen] if depth else np.zeros(len(chosen), dtype=bool),
+                name_only[chosen],
+            ))
+        out.append((counts, tops))
+    return out
@@ -1,35 +1,113 @@
 # stylist_core.py
 from __future__ import annotations
+import asyncio
 import os
-from typing import Dict, List, Optional
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import os
+import numpy as np
 import pandas as pd
 
+import httpx
 import openai
 import prompts
 from prompts import OneTotalLook, Item
+from catalog import CatalogIndex
+from llm_backend import LLMBackend, LLMResult, OpenAIBackend, backend_from_env
+from llm_cache import cache_key, get_look_cache
+from ranking import score_candidates, top_k
+from telemetry import span
 from pydantic import parse_obj_as
 
+if TYPE_CHECKING:
+    from sharded import ShardedMatcher
 
 
-# ---------- LLM call ----------
-def generate_look(user_text: str, model: str = "gpt-4.1-mini") -> OneTotalLook:
+
+# ---------- LLM client ----------
+load_dotenv()
+
+# Один пул соединений на процесс: TLS-рукопожатие и keep-alive переиспользуются между луками.
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0)
+LLM_TIMEOUT = 60.0
+
+_client: Optional[openai.OpenAI] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_backend: Optional[LLMBackend] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> openai.OpenAI:
     """
-    Запрашивает LLM и возвращает структурированный OneTotalLook.
-    Ключ API можно передать напрямую или через переменную окружения OPENAI_API_KEY.
+    Долгоживущий клиент OpenAI, создается лениво при первом запросе.
+    OPENAI_BASE_URL позволяет направить запросы на локальный stub-сервер.
     """
-    
-    load_dotenv()
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = openai.OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+                timeout=LLM_TIMEOUT,
+                http_client=openai.DefaultHttpxClient(limits=HTTP_LIMITS),
+            )
+        return _client
+
+
+def get_async_client() -> openai.AsyncOpenAI:
+    """AsyncOpenAI с общим пулом соединений; пул httpx привязан к event loop, поэтому клиент — на каждый loop."""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = openai.AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+                timeout=LLM_TIMEOUT,
+                http_client=openai.DefaultAsyncHttpxClient(limits=HTTP_LIMITS),
+            )
+        return client
+
+
+def reset_clients() -> None:
+    """Сбрасывает клиентов и бэкенд, например после смены OPENAI_API_KEY / OPENAI_BASE_URL / LLM_BACKEND."""
+    global _client, _backend
+    with _client_lock:
+        _client = None
+        _backend = None
+        _async_clients.clear()
 
-    api_key = os.getenv("OPENAI_API_KEY")
-    client = openai.OpenAI(api_key=api_key)
+
+def get_backend() -> LLMBackend:
+    """Бэкенд LLM процесса: OpenAI на общих клиентах или stub (LLM_BACKEND=stub) — см. llm_backend."""
+    global _backend
+    backend = _backend
+    if backend is None:
+        backend = backend_from_env(lambda: OpenAIBackend(get_client, get_async_client))
+        with _client_lock:
+            _backend = _backend or backend
+            backend = _backend
+    return backend
+
+
+def set_backend(backend: Optional[LLMBackend]) -> None:
+    """Подменяет бэкенд (нагрузочные тесты, replay); None — вернуть выбор по окружению."""
+    global _backend
+    with _client_lock:
+        _backend = backend
+
+
+# ---------- LLM call ----------
+def _look_request(user_text: str, model: str) -> dict:
     messages = [
         {"role": "system", "content": prompts.TOTAL_CREATIONLOOK_PROMPT.format(request=user_text)},
     ]
-
-    response = client.beta.chat.completions.parse(
+    return dict(
         model=model,
         messages=messages,
         temperature=0.0,
@@ -37,95 +115,310 @@ def generate_look(user_text: str, model: str = "gpt-4.1-mini") -> OneTotalLook:
         response_format=OneTotalLook,
     )
 
-    # .parse() возвращает специальный объект, сама модель в .choices[0].message.parsed
-    look = response.choices[0].message.parsed
-    look = parse_obj_as(OneTotalLook, look)
-    return look
+
+def _parsed_look(result: LLMResult) -> OneTotalLook:
+    return parse_obj_as(OneTotalLook, result.parsed)
+
+
+def generate_look(user_text: str, model: str = "gpt-4.1-mini", use_cache: bool = True) -> OneTotalLook:
+    """
+    Запрашивает LLM и возвращает структурированный OneTotalLook.
+    Ключ API берется из переменной окружения OPENAI_API_KEY (или .env).
+    Ответы кэшируются по (нормализованный запрос, модель, хэш промпта, бэкенд) — см. llm_cache.
+    """
+    with span("generate_look") as s:
+        backend = get_backend()
+        cache = get_look_cache() if use_cache else None
+        key = cache_key(user_text, model, prompts.TOTAL_CREATIONLOOK_PROMPT, backend.name)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                s.set(cache_hits=1)
+                return cached
+
+        started = time.perf_counter()
+        with span("llm_call"):
+            result = backend.parse(**_look_request(user_text, model))
+        look = _parsed_look(result)
+
+        if cache is not None:
+            cache.put(key, look, seconds=time.perf_counter() - started, tokens=result.total_tokens)
+        return look
+
+
+async def agenerate_look(user_text: str, model: str = "gpt-4.1-mini", use_cache: bool = True) -> OneTotalLook:
+    """Асинхронный вариант generate_look на AsyncOpenAI — вызов LLM без отдельного потока на запрос."""
+    with span("agenerate_look") as s:
+        backend = get_backend()
+        cache = get_look_cache() if use_cache else None
+        key = cache_key(user_text, model, prompts.TOTAL_CREATIONLOOK_PROMPT, backend.name)
+        if cache is not None:
+            # SQLite (чтение и WAL-запись) — в потоке, чтобы не блокировать event loop сервиса
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                s.set(cache_hits=1)
+                return cached
+
+        started = time.perf_counter()
+        with span("llm_call"):
+            result = await backend.aparse(**_look_request(user_text, model))
+        look = _parsed_look(result)
+
+        if cache is not None:
+            await asyncio.to_thread(
+                cache.put, key, look, seconds=time.perf_counter() - started, tokens=result.total_tokens
+            )
+        return look
 
 
 # ---------- DF utilities ----------
-def match_item(df: pd.DataFrame, itm: Item) -> pd.DataFrame:
+# Порядок уточнения: каждый следующий признак сужает уровень-родитель (по умолчанию — предыдущий).
+MATCH_LEVELS = ("color", "fabric", "pattern", "detailes")
+# detailes, как и в исходной лестнице, фильтрует уровень ткани, а не узора;
+# до него каскад доходит, только если на уровне узора осталось ≥ MIN_LEVEL_HITS
+LEVEL_PARENT = {"fabric": "color", "pattern": "fabric", "detailes": "fabric"}
+MIN_LEVEL_HITS = 2
+
+
+# индексы для вызовов без `index`: последние DataFrame по id (индекс держит свой df, id не переиспользуется)
+_FRAME_INDEX_SLOTS = 2
+_frame_indexes: "OrderedDict[int, CatalogIndex]" = OrderedDict()
+_frame_index_lock = threading.Lock()
+
+
+def frame_index(df: pd.DataFrame) -> CatalogIndex:
     """
-    Оставляет строки c совпадением по category_id[0] и (необязательно) другим признакам.
-    Раскомментируйте фильтры, как только заполните соответствующие столбцы датасета.
-    """
-    df_f = df[df["category_id"].str[0] == itm.category]
-    df_2 = df[df["name"].str.contains(itm.category)]
-    df_f = pd.concat([df_f, df_2])
-
-    if itm.color:  #and df_f.shape[0] >=4:
-        df_c = df_f[df_f["color"].str.contains(itm.color)]
-        df_2 = df_f[df_f["name"].str.contains(itm.color)]
-        df_c = pd.concat([df_c, df_2])
-        df_c.drop_duplicates(['image_external_url'], inplace=True)
-        if df_c.shape[0] >=2:
-            if itm.fabric: 
-                df_ff = df_c[df_c["name"].str.contains(itm.fabric)]
-                df_ff.drop_duplicates(['image_external_url'], inplace=True)
-                if df_ff.shape[0] >=2:
-                    if itm.pattern:
-                        df_p = df_ff[df_ff["name"].str.contains(itm.pattern)]
-                        df_p.drop_duplicates(['image_external_url'], inplace=True)
-                        if df_p.shape[0] >=2:
-                            if itm.detailes:
-                                df_detailes = df_ff[df_ff["detailes"] == itm.detailes]
-                                df_detailes.drop_duplicates(['image_external_url'], inplace=True)
-                                if df_detailes.shape[0] >=2:
-                                    return df_detailes
-                                else:
-                                    return df_p
-                        else:
-                            return df_ff
-                    else:
-                        return df_ff
-                else:
-                    return df_c
-            else: 
-                return df_c
-        else:
-            return df_f
-    else:
-        return df_f
+    CatalogIndex для DataFrame, строится один раз на объект: повторные вызовы match_item /
+    filter_dataset без `index` не токенизируют каталог заново. DataFrame не должен меняться на месте.
+    """
+    with _frame_index_lock:
+        index = _frame_indexes.get(id(df))
+        if index is not None and index.df is df:
+            _frame_indexes.move_to_end(id(df))
+            return index
+    index = CatalogIndex(df)
+    with _frame_index_lock:
+        _frame_indexes[id(df)] = index
+        while len(_frame_indexes) > _FRAME_INDEX_SLOTS:
+            _frame_indexes.popitem(last=False)
+    return index
 
 
+def _ordered_union(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """pd.concat([first, second]) без повторов: сначала first, затем новые из second."""
+    return np.concatenate([first, second[~np.isin(second, first)]])
 
-def filter_dataset(
+
+def attribute_masks(
+    index: CatalogIndex,
+    itm: Item,
+    rows: Optional[np.ndarray] = None,
+    season: Optional[str] = None,
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Кандидаты по категории и булевы маски всех признаков над ними — за один проход.
+    Кандидаты: сначала совпадения category_id[0], затем совпадения по name;
+    маска 'color_field' отмечает совпадение по колонке color или по color_hsl,
+    'color_unique' — уровень цвета без повторов картинки (первая строка на URL в порядке
+    выдачи уровня: сначала совпадения по color), 'season' — совпадение с сезоном лука
+    (используется только в ранжировании). Уровень категории не дедуплицируется.
+    """
+    candidates = _ordered_union(index.category_rows(itm.category), index.token_rows("name", itm.category))
+    if rows is not None:
+        candidates = candidates[np.isin(candidates, rows)]
+
+    masks: Dict[str, np.ndarray] = {
+        "category": np.isin(candidates, index.category_rows(itm.category)),
+    }
+    if itm.color:
+        masks["color_field"] = np.isin(candidates, index.color_rows(itm.color))
+        masks["color"] = masks["color_field"] | np.isin(candidates, index.token_rows("name", itm.color))
+        # дедупликация по URL — после фильтра по цвету, чтобы повтор картинки, прошедший
+        # фильтр, не терялся из-за первой строки с тем же URL, которая его не прошла
+        order = np.argsort(~masks["color_field"], kind="stable")
+        in_color = candidates[order[masks["color"][order]]]
+        masks["color_unique"] = np.isin(candidates, index.dedup(in_color))
+    if itm.fabric:
+        masks["fabric"] = np.isin(candidates, index.token_rows("name", itm.fabric))
+    if itm.pattern:
+        masks["pattern"] = np.isin(candidates, index.token_rows("name", itm.pattern))
+    if itm.detailes:
+        masks["detailes"] = np.isin(candidates, index.token_rows("detailes", itm.detailes))
+    if season:
+        masks["season"] = np.isin(candidates, index.season_rows(season))
+    return candidates, masks
+
+
+def cascade_levels(masks: Dict[str, np.ndarray], itm: Item) -> List[np.ndarray]:
+    """
+    Накопленные маски уровней каскада (color, color & fabric, ...) до первого незаданного признака;
+    каждый уровень уточняет своего родителя из LEVEL_PARENT. Уровень цвета берется без повторов
+    картинки (см. attribute_masks), глубже — уточняется он.
+    """
+    levels: Dict[str, np.ndarray] = {}
+    for attr in MATCH_LEVELS:
+        if not getattr(itm, attr):
+            break
+        mask = masks["color_unique"] if attr == "color" else masks[attr]
+        parent = LEVEL_PARENT.get(attr)
+        levels[attr] = mask if parent is None else levels[parent] & mask
+    return list(levels.values())
+
+
+def level_depth(counts: List[int]) -> int:
+    """Глубина каскада по числу попаданий на уровнях: самый глубокий уровень, где их ≥ MIN_LEVEL_HITS."""
+    depth = 0
+    while depth < len(counts) and counts[depth] >= MIN_LEVEL_HITS:
+        depth += 1
+    return depth
+
+
+def select_level(
+    candidates: np.ndarray,
+    masks: Dict[str, np.ndarray],
+    itm: Item,
+    depth: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Каскад уточнений без промежуточных DataFrame: берет самый глубокий уровень,
+    на котором осталось не меньше MIN_LEVEL_HITS позиций. Цепочка обрывается
+    на первом незаданном признаке. `depth` задает уровень явно (шарды, где счетчики
+    попаданий общие для всего каталога). Возвращает индексы выбранных кандидатов в порядке выдачи.
+    """
+    levels = cascade_levels(masks, itm)
+    if depth is None:
+        depth = level_depth([int(np.count_nonzero(level)) for level in levels])
+    if depth == 0:
+        return np.arange(len(candidates))
+    selected = levels[depth - 1]
+    # на уровнях с цветом сначала идут совпадения по колонке color
+    order = np.argsort(~masks["color_field"], kind="stable")
+    return order[selected[order]]
+
+
+def rank_item(
+    index: CatalogIndex,
+    itm: Item,
+    rows: Optional[np.ndarray] = None,
+    season: Optional[str] = None,
+    k: int = 1,
+) -> np.ndarray:
+    """
+    Позиции k лучших строк для Item: каскад select_level задает множество кандидатов,
+    внутри него ранжирование по взвешенным совпадениям признаков и уверенности экстрактора.
+    """
+    with span("rank_item") as s:
+        candidates, masks = attribute_masks(index, itm, rows, season)
+        picked = select_level(candidates, masks, itm)
+        positions = candidates[picked]
+        scores = score_candidates(
+            {attr: mask[picked] for attr, mask in masks.items()},
+            len(picked),
+            confidence=index.confidence_at(positions),
+        )
+        best = positions[top_k(scores, k)]
+        s.set(rows_scanned=len(candidates), candidates=len(best))
+        return best
+
+
+def match_item(
     df: pd.DataFrame,
-    look: OneTotalLook,
-    max_per_item: int = 1,
-    use_unisex_choice: bool = True
-) -> Dict[str, pd.DataFrame]:
+    itm: Item,
+    index: Optional[CatalogIndex] = None,
+    rows: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
     """
-    Возвращает словарь { '<part>_<category>_<idx>': DataFrame }.
+    Оставляет строки c совпадением по category_id[0] и (необязательно) другим признакам.
+    Фильтры разрешаются через CatalogIndex; `rows` — позиции строк индекса,
+    доступные для выбора (например, срез по полу). DataFrame материализуется один раз.
     """
+    if index is None:
+        index = frame_index(df)
+    with span("match_item") as s:
+        candidates, masks = attribute_masks(index, itm, rows)
+        positions = candidates[select_level(candidates, masks, itm)]
+        s.set(rows_scanned=len(candidates), candidates=len(positions))
+        return index.take(positions)
 
-    # 1️⃣ базовый срез по полу
-    if look.sex and use_unisex_choice:
-        df_base = df[df["gender"].str.lower().isin({"unisex", look.sex.lower()})]
-    elif look.sex:
-        df_base = df[df["gender"].str.lower().isin({look.sex})]
-    else:
-        df_base = df.copy()
 
-    results: Dict[str, pd.DataFrame] = {}
 
-    # 2️⃣ обходим все поля модели, кроме служебных
+def _look_items(look: OneTotalLook):
+    """(part_name, idx, Item) по всем полям лука, кроме служебных."""
     for part_name in (f for f in OneTotalLook.model_fields if f not in {"sex", "season"}):
         items = getattr(look, part_name)
         if not items:                      # None или пустой список
             continue
-
-        # 3️⃣ обрабатываем каждый Item отдельно
         for idx, itm in enumerate(items):
             if not isinstance(itm, Item):              # на всякий случай
                 itm = Item.model_validate(itm)
+            yield part_name, idx, itm
 
-            sub = match_item(df_base, itm)
-            if sub is not None and not sub.empty:
-                key = f"{part_name}_{itm.category}_{idx}"
-                results[key] = sub.head(max_per_item)
 
-    return results
+def filter_datasets(
+    df: pd.DataFrame,
+    looks: List[OneTotalLook],
+    max_per_item: int = 1,
+    use_unisex_choice: bool = True,
+    index: Optional[CatalogIndex] = None,
+    matcher: Optional["ShardedMatcher"] = None,
+) -> List[Dict[str, pd.DataFrame]]:
+    """
+    Пакетный filter_dataset: для каждого лука — словарь { '<part>_<category>_<idx>': DataFrame }.
+    Срез по полу берется из заранее построенных разбиений индекса, а каждый уникальный предикат
+    (пол, сезон, category, color, fabric, pattern, detailes) — один раз на весь пакет.
+    В каждом DataFrame — top-`max_per_item` кандидатов по скору (см. ranking).
+    `matcher` — sharded.ShardedMatcher: предикаты считаются параллельно в процессах-шардах.
+    """
+    if matcher is not None:
+        index = matcher.index
+    elif index is None:
+        index = frame_index(df)
+
+    with span("filter_dataset", looks=len(looks)) as s:
+        # 1️⃣ уникальные предикаты пакета и куда положить их результат
+        requests: Dict[tuple, Tuple[Item, Optional[str], Optional[str]]] = {}
+        plan: List[Tuple[int, str, tuple]] = []
+        for look_idx, look in enumerate(looks):
+            sex = look.sex.lower() if look.sex else None
+            for part_name, idx, itm in _look_items(look):
+                predicate = (sex, look.season, itm.category, itm.color, itm.fabric, itm.pattern, itm.detailes)
+                requests.setdefault(predicate, (itm, sex, look.season))
+                plan.append((look_idx, f"{part_name}_{itm.category}_{idx}", predicate))
+
+        # 2️⃣ ранжирование: срез по полу — готовый массив позиций из индекса
+        if matcher is not None:
+            ranked = dict(zip(requests, matcher.rank_many(list(requests.values()), use_unisex_choice, max_per_item)))
+        else:
+            ranked = {
+                predicate: rank_item(index, itm, index.gender_rows(sex, use_unisex_choice), season, max_per_item)
+                for predicate, (itm, sex, season) in requests.items()
+            }
+
+        # 3️⃣ материализация строк
+        out: List[Dict[str, pd.DataFrame]] = [{} for _ in looks]
+        for look_idx, key, predicate in plan:
+            positions = ranked[predicate]
+            if len(positions):
+                out[look_idx][key] = index.take(positions)
+        s.set(candidates=sum(len(part) for results in out for part in results.values()))
+
+    return out
+
+
+def filter_dataset(
+    df: pd.DataFrame,
+    look: OneTotalLook,
+    max_per_item: int = 1,
+    use_unisex_choice: bool = True,
+    index: Optional[CatalogIndex] = None,
+    matcher: Optional["ShardedMatcher"] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Возвращает словарь { '<part>_<category>_<idx>': DataFrame }.
+    `index` — CatalogIndex, построенный по `df` один раз при загрузке каталога;
+    без него берется frame_index(df) — индекс строится один раз на DataFrame.
+    """
+    return filter_datasets(df, [look], max_per_item, use_unisex_choice, index, matcher)[0]
 
 
 
@@ -0,0 +1,154 @@
+# telemetry.py
+from __future__ import annotations
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+# Границы бакетов гистограммы длительностей, секунды (как у Prometheus-клиентов)
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ENABLED = os.getenv("TELEMETRY_DISABLED") != "1"
+
+
+class Span:
+    """Один замер этапа: длительность и числовые атрибуты (строк просмотрено, кандидатов и т.п.)."""
+    __slots__ = ("stage", "seconds", "attrs")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.seconds = 0.0
+        self.attrs: Dict[str, float] = {}
+
+    def set(self, **attrs: float) -> None:
+        self.attrs.update(attrs)
+
+    def as_dict(self) -> dict:
+        return {"stage": self.stage, "seconds": self.seconds, **self.attrs}
+
+
+class _StageStats:
+    __slots__ = ("buckets", "count", "total", "attrs")
+
+    def __init__(self):
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)   # последний — +Inf
+        self.count = 0
+        self.total = 0.0
+        self.attrs: Dict[str, float] = {}
+
+
+class Registry:
+    """Агрегаты по этапам в памяти процесса: гистограмма длительностей + суммы атрибутов."""
+
+    def __init__(self):
+        self._stages: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span: Span) -> None:
+        i = bisect.bisect_left(DURATION_BUCKETS, span.seconds)
+        with self._lock:
+            stats = self._stages.get(span.stage)
+            if stats is None:
+                stats = self._stages[span.stage] = _StageStats()
+            stats.buckets[i] += 1
+            stats.count += 1
+            stats.total += span.seconds
+            for name, value in span.attrs.items():
+                stats.attrs[name] = stats.attrs.get(name, 0.0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def to_json(self) -> str:
+        """Снимок метрик: по этапу — count, sum, среднее, p50/p95 по бакетам и суммы атрибутов."""
+        with self._lock:
+            data = {
+                stage: {
+                    "count": s.count,
+                    "sum_seconds": s.total,
+                    "mean_seconds": s.total / s.count if s.count else 0.0,
+                    "p50_seconds": _bucket_quantile(s.buckets, s.count, 0.50),
+                    "p95_seconds": _bucket_quantile(s.buckets, s.count, 0.95),
+                    "buckets": dict(zip([*map(str, DURATION_BUCKETS), "+Inf"], s.buckets)),
+                    "totals": dict(s.attrs),
+                }
+                for stage, s in self._stages.items()
+            }
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix: str = "stylist") -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)."""
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Duration of stylist request stages.",
+            f"# TYPE {prefix}_stage_duration_seconds histogram",
+        ]
+        totals: List[str] = []
+        with self._lock:
+            for stage, s in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, n in zip([*map(str, DURATION_BUCKETS), "+Inf"], s.buckets):
+                    cumulative += n
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {s.total}')
+                lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {s.count}')
+                for name, value in sorted(s.attrs.items()):
+                    totals.append(f'{prefix}_stage_{name}_total{{stage="{stage}"}} {value}')
+        for metric in sorted({line.split("{")[0] for line in totals}):
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(line for line in totals if line.startswith(metric + "{"))
+        return "\n".join(lines) + "\n"
+
+
+def _bucket_quantile(buckets: List[int], count: int, q: float) -> float:
+    """Оценка квантиля по гистограмме — верхняя граница бакета, как histogram_quantile."""
+    if not count:
+        return 0.0
+    target, seen = q * count, 0
+    for bound, n in zip(DURATION_BUCKETS, buckets):
+        seen += n
+        if seen >= target:
+            return bound
+    return float("inf")
+
+
+REGISTRY = Registry()
+# спаны текущего запроса (если он собирается через trace())
+_current_trace: contextvars.ContextVar[Optional[List[Span]]] = contextvars.ContextVar("stylist_trace", default=None)
+
+
+@contextmanager
+def span(stage: str, **attrs: float) -> Iterator[Span]:
+    """
+    Замер этапа запроса: `with span("match_item", rows_scanned=n) as s: ...; s.set(candidates=k)`.
+    Стоимость — два perf_counter и одно обновление словаря под блокировкой.
+    """
+    s = Span(stage)
+    s.attrs.update(attrs)
+    if not ENABLED:
+        yield s
+        return
+    started = time.perf_counter()
+    try:
+        yield s
+    finally:
+        s.seconds = time.perf_counter() - started
+        REGISTRY.observe(s)
+        trace_spans = _current_trace.get()
+        if trace_spans is not None:
+            trace_spans.append(s)
+
+
+@contextmanager
+def trace() -> Iterator[List[Span]]:
+    """Собирает спаны одного запроса (в текущем потоке/задаче) — для разбора медленного лука."""
+    spans: List[Span] = []
+    token = _current_trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
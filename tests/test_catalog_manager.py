@@ -0,0 +1,72 @@
+import warnings
+
+import pandas as pd
+
+from bench.synthetic import generate_catalog
+from catalog import CatalogIndex, load_catalog, prepare_catalog
+from catalog_manager import CatalogManager
+
+
+def _write_csv(df: pd.DataFrame, path) -> None:
+    df.assign(category_id=[[str(c) for c in v] for v in df["category_id"]]).to_csv(path, index=False)
+
+
+def _delta(n_rows: int) -> pd.DataFrame:
+    delta = generate_catalog(n_rows, seed=7)
+    delta["good_id"] += 10_000_000
+    delta["image_external_url"] = delta["image_external_url"].str.replace("/img/", "/new/")
+    return delta.assign(category_id=[[str(c) for c in v] for v in delta["category_id"]])
+
+
+def test_csv_catalog_compacts_large_delta(tmp_path):
+    base = generate_catalog(1000, seed=1)
+    _write_csv(base, tmp_path / "catalog.csv")
+    (tmp_path / "deltas").mkdir()
+    delta = _delta(300)
+    delta.to_parquet(tmp_path / "deltas" / "001.parquet", index=False)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        manager = CatalogManager(tmp_path / "catalog.csv", delta_dir=tmp_path / "deltas")
+
+    index = manager.current()
+    assert index.version == 2                       # дельта + сжатие
+    assert index.n_rows == 1300
+    assert not index.segmented                      # 300 > 0.2 * 1300 — сжат в один сегмент
+
+    reference = CatalogIndex(prepare_catalog(pd.concat([load_catalog(tmp_path / "catalog.csv"), delta], ignore_index=True)))
+    for word in ("платье", "кожа", "красный"):
+        assert index.token_rows("name", word).tolist() == reference.token_rows("name", word).tolist()
+    assert index.category_rows("сумка").tolist() == reference.category_rows("сумка").tolist()
+
+
+def test_failed_delta_does_not_stop_later_ones(tmp_path, monkeypatch):
+    _write_csv(generate_catalog(200, seed=1), tmp_path / "catalog.csv")
+    (tmp_path / "deltas").mkdir()
+    manager = CatalogManager(tmp_path / "catalog.csv", delta_dir=tmp_path / "deltas")
+
+    _delta(5).to_parquet(tmp_path / "deltas" / "001.parquet", index=False)
+    _delta(5).assign(good_id=lambda d: d["good_id"] + 1000).to_parquet(tmp_path / "deltas" / "002.parquet", index=False)
+    original = manager.apply
+    calls = []
+
+    def flaky(delta):
+        calls.append(len(delta))
+        if len(calls) == 1:
+            raise ValueError("broken delta")
+        return original(delta)
+
+    monkeypatch.setattr(manager, "apply", flaky)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        assert manager.poll() == 1
+    assert any("001.parquet failed to apply" in str(w.message) for w in caught)
+    assert manager.current().n_rows == 205
+    assert manager.poll() == 0                      # неизмененный сломанный файл не применяется повторно
+
+
+def test_csv_catalog_keeps_numeric_ids(tmp_path):
+    _write_csv(generate_catalog(50, seed=2), tmp_path / "catalog.csv")
+    df = load_catalog(tmp_path / "catalog.csv")
+    assert pd.api.types.is_integer_dtype(df["store_id"])
+    assert pd.api.types.is_integer_dtype(df["good_id"])
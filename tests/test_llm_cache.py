@@ -0,0 +1,24 @@
+import asyncio
+
+import stylist_core
+from llm_backend import StubBackend
+from llm_cache import LookCache
+
+
+def test_stub_looks_are_not_served_to_openai(tmp_path, monkeypatch):
+    cache = LookCache(tmp_path / "looks.sqlite")
+    monkeypatch.setattr(stylist_core, "get_look_cache", lambda: cache)
+    stub = StubBackend()
+    stylist_core.set_backend(stub)
+    try:
+        stylist_core.generate_look("летний образ на прогулку")
+        asyncio.run(stylist_core.agenerate_look("летний образ на прогулку"))
+        assert stub.calls == 1 and cache.stats()["memory_hits"] == 1
+
+        other = StubBackend(seed=1)
+        other.name = "openai"                 # тот же запрос на другом бэкенде — промах
+        stylist_core.set_backend(other)
+        stylist_core.generate_look("летний образ на прогулку")
+        assert other.calls == 1
+    finally:
+        stylist_core.set_backend(None)
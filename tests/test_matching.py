@@ -0,0 +1,65 @@
+import pandas as pd
+
+import stylist_core
+from catalog import CatalogIndex, prepare_catalog
+from prompts import Item
+from stylist_core import match_item
+
+
+def _catalog(rows, detailes=None):
+    df = pd.DataFrame(rows, columns=["good_id", "store_id", "name", "color", "image_external_url"])
+    df["category_id"] = [["платье"]] * len(df)
+    df["detailes"] = detailes or ""
+    return prepare_catalog(df)
+
+
+def test_duplicate_picture_that_passes_color_is_kept():
+    df = _catalog([
+        (1, 1, "Платье шелк", "синий", "a.jpg"),      # первая строка картинки a.jpg — не тот цвет
+        (2, 2, "Платье шелк", "красный", "a.jpg"),
+        (3, 1, "Платье хлопок", "красный", "b.jpg"),
+    ])
+    found = match_item(df, Item(category="платье", color="красный"), index=CatalogIndex(df))
+    assert found["good_id"].tolist() == [2, 3]
+
+
+def test_category_level_keeps_duplicate_pictures():
+    df = _catalog([
+        (1, 1, "Платье шелк", "синий", "a.jpg"),
+        (2, 2, "Платье шелк", "синий", "a.jpg"),
+    ])
+    # по цвету меньше двух совпадений — остается уровень категории, как и раньше без дедупликации
+    found = match_item(df, Item(category="платье", color="красный"), index=CatalogIndex(df))
+    assert found["good_id"].tolist() == [1, 2]
+
+
+def test_detailes_refine_fabric_level_as_the_ladder_did():
+    df = _catalog(
+        [
+            (1, 1, "Платье шелк клетка", "красный", "a.jpg"),
+            (2, 1, "Платье шелк клетка", "красный", "b.jpg"),
+            (3, 1, "Платье шелк", "красный", "c.jpg"),
+            (4, 1, "Платье шелк", "красный", "d.jpg"),
+        ],
+        detailes=["", "", "карманы", "карманы"],
+    )
+    index = CatalogIndex(df)
+    itm = Item(category="платье", color="красный", fabric="шелк", pattern="клетка")
+    # узор без detailes — уровень узора (лестница здесь возвращала None)
+    assert match_item(df, itm, index=index)["good_id"].tolist() == [1, 2]
+    # detailes уточняют уровень ткани, а не узора; узор лишь открывает этот шаг
+    itm = itm.model_copy(update={"detailes": "карманы"})
+    assert match_item(df, itm, index=index)["good_id"].tolist() == [3, 4]
+
+
+def test_index_is_built_once_per_frame(monkeypatch):
+    df = _catalog([
+        (1, 1, "Платье шелк", "красный", "a.jpg"),
+        (2, 2, "Платье хлопок", "красный", "b.jpg"),
+    ])
+    built = []
+    real = stylist_core.CatalogIndex
+    monkeypatch.setattr(stylist_core, "CatalogIndex", lambda frame: built.append(frame) or real(frame))
+    for _ in range(3):
+        assert match_item(df, Item(category="платье", color="красный"))["good_id"].tolist() == [1, 2]
+    assert len(built) == 1
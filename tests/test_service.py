@@ -0,0 +1,51 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import service
+import stylist_core
+from bench.fixtures import LOOKS
+from bench.synthetic import generate_catalog
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Сервис на синтетическом каталоге и stub-бэкенде LLM — без сети и ключа OpenAI."""
+    generate_catalog(2000, seed=3).to_parquet(tmp_path / "catalog.parquet", index=False)
+    monkeypatch.setenv("DATA_PATH", str(tmp_path / "catalog.parquet"))
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    monkeypatch.setenv("LOOK_CACHE_DISABLED", "1")       # настоящий кэш луков тесты не трогают
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    stylist_core.reset_clients()
+    with TestClient(service.app) as client:
+        yield client
+    stylist_core.reset_clients()
+
+
+def test_healthz_reports_catalog(client):
+    resp = client.get("/healthz")
+    assert resp.status_code == 200
+    assert resp.json()["catalog_rows"] == 2000
+
+
+def test_assemble_from_query_uses_stub_backend(client):
+    body = {"query": "летний образ на прогулку", "n_looks": 2}
+    first = client.post("/looks/assemble", json=body)
+    assert first.status_code == 200
+    assert stylist_core.get_backend().name == "stub"
+    # stub детерминирован: тот же запрос — тот же лук и те же образы
+    assert client.post("/looks/assemble", json=body).json() == first.json()
+
+
+def test_assemble_from_look_returns_skus(client):
+    look = LOOKS[0].model_dump()
+    resp = client.post("/looks/assemble", json={"look": look, "n_looks": 2, "max_per_item": 20})
+    assert resp.status_code == 200
+    outfits = resp.json()["outfits"]
+    assert outfits
+    for outfit in outfits:
+        for sku in outfit["items"].values():
+            assert {"good_id", "store_id", "image_external_url"} <= set(sku)
+
+
+def test_assemble_requires_look_or_query(client):
+    assert client.post("/looks/assemble", json={}).status_code == 422
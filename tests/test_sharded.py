@@ -0,0 +1,29 @@
+from multiprocessing import shared_memory
+
+import pytest
+
+import sharded
+from bench.synthetic import generate_catalog
+from catalog import CatalogIndex
+
+
+def _broken_init(*args):
+    raise RuntimeError("shard failed to start")
+
+
+def test_failed_startup_releases_shared_memory(monkeypatch):
+    created = []
+    real = shared_memory.SharedMemory
+
+    def tracked(*args, **kwargs):
+        shm = real(*args, **kwargs)
+        created.append(shm.name)
+        return shm
+
+    monkeypatch.setattr(sharded.shared_memory, "SharedMemory", tracked)
+    monkeypatch.setattr(sharded, "_init_worker", _broken_init)
+    with pytest.raises(Exception):
+        sharded.ShardedMatcher(CatalogIndex(generate_catalog(200, seed=5)), n_shards=2, start_method="fork")
+    assert created
+    with pytest.raises(FileNotFoundError):
+        real(name=created[0])